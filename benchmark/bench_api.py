@@ -0,0 +1,228 @@
+# benchmark/bench_api.py
+"""
+Benchmark : requêtes par seconde de l'API JSON (frontend/api.py) sur un cœur
+
+Lance l'API sous uvicorn (un seul processus, épinglé sur un cœur sous Linux)
+puis la charge avec des connexions HTTP/1.1 persistantes, sans dépendance :
+- lecture base   : GET /etudiants/<id>/examens, cache des réponses désactivé
+                   (API_RESPONSE_CACHE=0) : chaque requête lit PLANNING_ETUDIANT
+- consultation   : même requête, réponses déjà encodées en mémoire (200)
+- revalidation   : même requête avec If-None-Match (304 tant que le
+                   planning n'est pas republié)
+
+Les étudiants sont parcourus à tour de rôle (compte admin par défaut, qui
+peut lire tous les plannings). Utilise la configuration de connexion de
+l'application (.streamlit/secrets.toml ou DATABASE_URL) et la base telle
+qu'elle est ; --url vise une API déjà lancée (sans le scénario lecture base).
+
+    python benchmark/bench_api.py [--connexions 32] [--duree 10] [--etudiants 2000]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+FRONTEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend')
+sys.path.insert(0, FRONTEND)
+
+from db_utils import get_connection, release_connection
+
+
+# ==========================================
+# SERVEUR
+# ==========================================
+
+def start_server(port, core, response_cache=None):
+    """uvicorn api:app, un processus, sur le cœur `core` si possible"""
+    def pin():
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {core})
+
+    env = dict(os.environ)
+    if response_cache is not None:
+        env['API_RESPONSE_CACHE'] = str(response_cache)
+
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api:app', '--app-dir', FRONTEND,
+         '--port', str(port), '--workers', '1', '--no-access-log', '--log-level', 'warning'],
+        preexec_fn=pin, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def stop_server(server):
+    if server is not None:
+        server.terminate()
+        server.wait()
+
+
+async def wait_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.2)
+    return False
+
+
+# ==========================================
+# CLIENT HTTP/1.1 (connexion persistante)
+# ==========================================
+
+async def request(reader, writer, host, path, auth, etag=None):
+    """(statut, en-têtes, corps)"""
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}", f"Authorization: Basic {auth}"]
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b""
+    return int(status_line.split()[1]), headers, body
+
+
+async def worker(host, port, paths, offset, auth, etags, stop_at, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    while time.monotonic() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        status, headers, _ = await request(reader, writer, host, path, auth,
+                                           etags.get(path) if etags is not None else None)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[status] += 1
+    writer.close()
+
+
+async def scenario(name, host, port, paths, auth, connections, duration, etags=None):
+    latencies, statuses = [], Counter()
+    start = time.monotonic()
+    await asyncio.gather(*[
+        worker(host, port, paths, c * len(paths) // connections, auth, etags,
+               start + duration, latencies, statuses)
+        for c in range(connections)
+    ])
+    elapsed = time.monotonic() - start
+
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    codes = ", ".join(f"{code}: {n:,}" for code, n in sorted(statuses.items()))
+    print(f"{name:<14} {len(latencies) / elapsed:>10,.0f} {q[49]:>9.1f} {q[98]:>9.1f}   {codes}")
+
+
+async def collect_etags(host, port, paths, auth):
+    """ETag courant de chaque chemin (premier passage : remplit aussi le cache de l'API)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    for path in paths:
+        status, headers, _ = await request(reader, writer, host, path, auth)
+        if status == 200:
+            etags[path] = headers.get('etag')
+    writer.close()
+    return etags
+
+
+def student_ids(limit):
+    conn = get_connection()
+    if not conn:
+        return []
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+        SELECT id_etu FROM PLANNING_ETUDIANT
+        GROUP BY id_etu ORDER BY id_etu LIMIT %s;
+        """, (limit,))
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        conn.rollback()
+        release_connection(conn)
+
+
+async def run(args):
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+
+    ids = student_ids(args.etudiants)
+    if not ids:
+        print("❌ Aucun planning étudiant publié (PLANNING_ETUDIANT vide)")
+        return
+    paths = [f"/etudiants/{i}/examens" for i in ids]
+    auth = base64.b64encode(f"{args.utilisateur}:{args.mot_de_passe}".encode()).decode()
+
+    if not args.url:
+        # Le client tourne sur les autres cœurs (s'il y en a) : il ne prend pas le temps du serveur
+        others = set(range(os.cpu_count() or 1)) - {args.coeur}
+        if others and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, others)
+
+    where = "API existante" if args.url else f"1 processus uvicorn, cœur {args.coeur}"
+    if not args.url and (os.cpu_count() or 1) == 1:
+        where += ", client sur le même cœur"
+    print(f"\n{len(paths):,} étudiants, {args.connexions} connexions, {args.duree}s par scénario ({where})\n")
+    print(f"{'Scénario':<14} {'Req/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9}   Statuts")
+    print("-" * 70)
+
+    # Sans cache des réponses : le chemin base de données de chaque requête
+    if not args.url:
+        server = start_server(port, args.coeur, response_cache=0)
+        try:
+            if not await wait_ready(host, port):
+                print("❌ L'API ne répond pas")
+                return
+            await scenario("lecture base", host, port, paths, auth, args.connexions, args.duree)
+        finally:
+            stop_server(server)
+
+    server = None if args.url else start_server(port, args.coeur)
+    try:
+        if not await wait_ready(host, port):
+            print("❌ L'API ne répond pas")
+            return
+
+        etags = await collect_etags(host, port, paths, auth)
+        if not etags:
+            print("❌ Aucune réponse 200 : identifiants ou droits insuffisants ?")
+            return
+
+        await scenario("consultation", host, port, paths, auth, args.connexions, args.duree)
+        await scenario("revalidation", host, port, paths, auth, args.connexions, args.duree, etags)
+    finally:
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connexions', type=int, default=32)
+    parser.add_argument('--duree', type=float, default=10, help="secondes par scénario")
+    parser.add_argument('--etudiants', type=int, default=2000)
+    parser.add_argument('--utilisateur', default='admin')
+    parser.add_argument('--mot-de-passe', default='admin123')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--coeur', type=int, default=0, help="cœur CPU du serveur")
+    parser.add_argument('--url', help="API déjà lancée (ex. http://localhost:8000)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# benchmark/bench_exam_schedule.py
+"""
+Benchmark : lignes traitées par les requêtes de planning (EXPLAIN ANALYZE)
+
+Compare les anciennes requêtes (INSCRIPTION et SURVEILLANCE x PROFESSEUR
+joints dans le même GROUP BY) aux requêtes actuelles de queries.py
+(nb_inscrits maintenu, surveillants pré-agrégés ou lus en LATERAL,
+planning étudiant précalculé) :
+- load_exam_schedule
+- load_student_own_exams (PLANNING_ETUDIANT, reconstruit à la publication)
+- load_professor_surveillances
+
+Mesure, pour chaque requête, le total des lignes produites par tous les
+noeuds du plan (lignes x boucles) et le temps d'exécution médian.
+Utilise la configuration de connexion de l'application
+(.streamlit/secrets.toml ou DATABASE_URL) et la base telle qu'elle est.
+
+    python benchmark/bench_exam_schedule.py [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
+from db_utils import get_connection, release_connection
+from queries import EXAM_SCHEDULE_QUERY, STUDENT_EXAMS_QUERY, PROFESSOR_SURVEILLANCES_QUERY
+
+
+# ==========================================
+# ANCIENNES REQUÊTES (avant réécriture)
+# ==========================================
+LEGACY_EXAM_SCHEDULE = """
+SELECT
+    e.id_exam, e.date_exam, e.duree_min, e.type_examen, e.session_examen,
+    m.nom AS module, l.nom AS salle, l.capacite,
+    COUNT(DISTINCT i.id_etu) AS nb_inscrits,
+    STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants,
+    STRING_AGG(DISTINCT s.role, ', ') AS roles
+FROM EXAMEN e
+JOIN MODULE m ON e.id_mod = m.id_mod
+JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
+LEFT JOIN SURVEILLANCE s ON e.id_exam = s.id_exam
+LEFT JOIN PROFESSEUR p ON s.id_prof = p.id_prof
+GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen,
+         e.session_examen, m.nom, l.nom, l.capacite
+ORDER BY e.date_exam;
+"""
+
+LEGACY_STUDENT_EXAMS = """
+SELECT
+    e.id_exam, e.date_exam, e.duree_min, e.type_examen, e.session_examen,
+    m.nom AS module, m.credits, m.coefficient,
+    l.nom AS salle, l.batiment, l.capacite, i.statut, i.note,
+    STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants
+FROM INSCRIPTION i
+JOIN MODULE m ON i.id_mod = m.id_mod
+JOIN EXAMEN e ON m.id_mod = e.id_mod
+JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+LEFT JOIN SURVEILLANCE s ON e.id_exam = s.id_exam
+LEFT JOIN PROFESSEUR p ON s.id_prof = p.id_prof
+WHERE i.id_etu = %s
+GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen,
+         e.session_examen, m.nom, m.credits, m.coefficient,
+         l.nom, l.batiment, l.capacite, i.statut, i.note
+ORDER BY e.date_exam;
+"""
+
+LEGACY_PROFESSOR_SURVEILLANCES = """
+SELECT
+    e.id_exam, e.date_exam, e.duree_min, e.type_examen, e.session_examen,
+    m.nom AS module, f.nom AS formation, f.niveau,
+    l.nom AS salle, l.batiment, l.capacite,
+    COUNT(DISTINCT i.id_etu) AS nb_inscrits,
+    s.role,
+    STRING_AGG(DISTINCT p2.nom || ' ' || p2.prenom, ', ')
+        FILTER (WHERE p2.id_prof != %s) AS autres_surveillants
+FROM SURVEILLANCE s
+JOIN EXAMEN e ON s.id_exam = e.id_exam
+JOIN MODULE m ON e.id_mod = m.id_mod
+JOIN FORMATION f ON m.id_form = f.id_form
+JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
+LEFT JOIN SURVEILLANCE s2 ON e.id_exam = s2.id_exam
+LEFT JOIN PROFESSEUR p2 ON s2.id_prof = p2.id_prof
+WHERE s.id_prof = %s
+GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen,
+         e.session_examen, m.nom, f.nom, f.niveau,
+         l.nom, l.batiment, l.capacite, s.role
+ORDER BY e.date_exam;
+"""
+
+
+# ==========================================
+# MESURE
+# ==========================================
+
+def rows_processed(node):
+    """Lignes produites par un noeud du plan et tous ses enfants"""
+    # PostgreSQL 18 donne des lignes moyennes par boucle non entières
+    total = round(node.get('Actual Rows', 0) * node.get('Actual Loops', 1))
+    return total + sum(rows_processed(child) for child in node.get('Plans', []))
+
+
+def explain(cur, query, params, repeat):
+    """(lignes traitées, lignes renvoyées, temps médian en ms)"""
+    timings = []
+    for _ in range(repeat):
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+        result = cur.fetchone()[0][0]
+        timings.append(result['Execution Time'])
+
+    plan = result['Plan']
+    return rows_processed(plan), round(plan['Actual Rows']), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if not conn:
+        print("❌ Impossible de se connecter à PostgreSQL")
+        return
+
+    try:
+        cur = conn.cursor()
+
+        # Étudiant et professeur ayant le plus d'examens (cas le plus coûteux)
+        cur.execute("""
+        SELECT i.id_etu FROM INSCRIPTION i JOIN EXAMEN e ON i.id_mod = e.id_mod
+        GROUP BY i.id_etu ORDER BY COUNT(*) DESC LIMIT 1;
+        """)
+        id_etu = (cur.fetchone() or [None])[0]
+        cur.execute("SELECT id_prof FROM SURVEILLANCE GROUP BY id_prof ORDER BY COUNT(*) DESC LIMIT 1;")
+        id_prof = (cur.fetchone() or [None])[0]
+
+        cases = [
+            ("load_exam_schedule", LEGACY_EXAM_SCHEDULE, (), EXAM_SCHEDULE_QUERY, ()),
+            (f"load_student_own_exams (etu {id_etu})",
+             LEGACY_STUDENT_EXAMS, (id_etu,), STUDENT_EXAMS_QUERY, (id_etu,)),
+            (f"load_professor_surveillances (prof {id_prof})",
+             LEGACY_PROFESSOR_SURVEILLANCES, (id_prof, id_prof), PROFESSOR_SURVEILLANCES_QUERY, (id_prof,)),
+        ]
+
+        print(f"{'Requête':<45} {'Version':<8} {'Lignes traitées':>16} {'Renvoyées':>10} {'Temps (ms)':>11}")
+        print("-" * 94)
+        for name, legacy, legacy_params, current, current_params in cases:
+            before = explain(cur, legacy, legacy_params, args.repeat)
+            after = explain(cur, current, current_params, args.repeat)
+
+            for version, (processed, returned, ms) in (("avant", before), ("après", after)):
+                print(f"{name:<45} {version:<8} {processed:>16,} {returned:>10,} {ms:>11.1f}")
+            print(f"{'':<45} {'gain':<8} {before[0] / max(after[0], 1):>15.1f}x {'':>10} "
+                  f"{before[2] / max(after[2], 0.001):>10.1f}x")
+
+        cur.close()
+    finally:
+        conn.rollback()
+        release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
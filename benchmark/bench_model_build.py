@@ -0,0 +1,145 @@
+# benchmark/bench_model_build.py
+"""
+Micro-benchmark : temps de construction du modèle CP-SAT du planificateur
+
+Compare l'ancienne construction (sommes Python + Add(...) + AddMaxEquality)
+à ExamScheduler.build_model (AddExactlyOne / AddAtMostOne / implications)
+sur des données synthétiques, sans base de données ni résolution.
+
+    python benchmark/bench_model_build.py [--modules 100 500 1000] [--jours 5] [--salles 30]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
+from ortools.sat.python import cp_model
+
+from occupancy import OccupancyIndex
+from repository import Module, Room
+from scheduler_engine import ExamScheduler
+
+
+def make_data(nb_modules, nb_jours, nb_salles, seed=42):
+    """Modules (8 par formation), salles et créneaux synthétiques"""
+    rng = random.Random(seed)
+
+    modules = [
+        Module(m, f"Module {m}", 4, 1.5, f"Formation {m // 8}", m // 8, "L1", rng.randint(15, 250))
+        for m in range(nb_modules)
+    ]
+    salles = [
+        Room(s, f"Salle {s}", rng.choice([30, 40, 60, 120, 250, 300]), "salle", "Bloc 1", None)
+        for s in range(nb_salles)
+    ]
+
+    start = datetime(2026, 1, 20)
+    creneaux = []
+    for jour in range(nb_jours):
+        date = start + timedelta(days=jour)
+        for heure in (9, 14):
+            creneaux.append({'date': date.replace(hour=heure), 'duree': 180, 'jour': jour})
+
+    # Quelques examens déjà en base
+    examens = [
+        (creneaux[rng.randrange(len(creneaux))]['date'], rng.randrange(nb_salles), 90)
+        for _ in range(nb_salles // 3)
+    ]
+
+    return modules, salles, creneaux, OccupancyIndex(examens)
+
+
+def build_legacy(modules, salles, creneaux, occupation):
+    """Construction d'origine : une variable par (m, c, s) et sommes Python"""
+    model = cp_model.CpModel()
+    num_modules, num_creneaux, num_salles = len(modules), len(creneaux), len(salles)
+
+    x = {}
+    for m in range(num_modules):
+        for c in range(num_creneaux):
+            for s in range(num_salles):
+                x[(m, c, s)] = model.NewBoolVar(f'x_{m}_{c}_{s}')
+
+    for m in range(num_modules):
+        model.Add(sum(x[(m, c, s)] for c in range(num_creneaux) for s in range(num_salles)) == 1)
+
+    for c in range(num_creneaux):
+        for s in range(num_salles):
+            model.Add(sum(x[(m, c, s)] for m in range(num_modules)) <= 1)
+
+    for m in range(num_modules):
+        for c in range(num_creneaux):
+            for s in range(num_salles):
+                if modules[m].nb_inscrits > salles[s].capacite:
+                    model.Add(x[(m, c, s)] == 0)
+
+    for m in range(num_modules):
+        for c in range(num_creneaux):
+            for s in range(num_salles):
+                if not occupation.is_free(salles[s].id_lieu, creneaux[c]['date'], creneaux[c]['duree']):
+                    model.Add(x[(m, c, s)] == 0)
+
+    formations = {}
+    for idx, module in enumerate(modules):
+        formations.setdefault(module.id_form, []).append(idx)
+    jours = sorted({cr['jour'] for cr in creneaux})
+    for module_indices in formations.values():
+        for jour in jours:
+            creneaux_jour = [c for c in range(num_creneaux) if creneaux[c]['jour'] == jour]
+            model.Add(sum(x[(m, c, s)] for m in module_indices
+                          for c in creneaux_jour for s in range(num_salles)) <= 1)
+
+    salles_utilisees = []
+    for s in range(num_salles):
+        salle_used = model.NewBoolVar(f'used_s{s}')
+        model.AddMaxEquality(salle_used, [x[(m, c, s)] for m in range(num_modules)
+                                          for c in range(num_creneaux)])
+        salles_utilisees.append(salle_used)
+    model.Minimize(sum(salles_utilisees))
+
+    return model
+
+
+def build_native(modules, salles, creneaux, occupation):
+    """Construction actuelle du planificateur"""
+    scheduler = ExamScheduler()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scheduler.build_model(modules, salles, creneaux, occupation)
+    return scheduler.model
+
+
+def timed(build, data):
+    t0 = time.perf_counter()
+    model = build(*data)
+    elapsed = time.perf_counter() - t0
+    proto = model.Proto()
+    return elapsed, len(proto.variables), len(proto.constraints)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modules', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--jours', type=int, default=5)
+    parser.add_argument('--salles', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'modules':>8} | {'ancien (s)':>10} | {'natif (s)':>9} | {'gain':>6} | "
+          f"{'vars ancien':>11} | {'vars natif':>10} | {'ctr ancien':>10} | {'ctr natif':>9}")
+    print("-" * 96)
+
+    for nb_modules in args.modules:
+        data = make_data(nb_modules, args.jours, args.salles)
+        t_old, v_old, c_old = timed(build_legacy, data)
+        t_new, v_new, c_new = timed(build_native, data)
+        print(f"{nb_modules:>8} | {t_old:>10.2f} | {t_new:>9.2f} | {t_old / t_new:>5.1f}x | "
+              f"{v_old:>11} | {v_new:>10} | {c_old:>10} | {c_new:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# benchmark/check_indexes.py
+"""
+Vérification des plans : les helpers sélectifs de queries.py utilisent des index
+
+1. crée un schéma jetable (verif_index), y applique toutes les migrations
+   et le remplit avec un jeu de données réaliste (13 000 étudiants par défaut) ;
+2. appelle les helpers avec capture des requêtes SQL exécutées ;
+3. passe chaque requête dans EXPLAIN (FORMAT JSON) et signale tout parcours
+   séquentiel (Seq Scan) d'une grande table.
+
+Les helpers qui agrègent des tables entières (tableaux de bord) sont
+seulement affichés : un parcours séquentiel y est le bon plan.
+Utilise la configuration de connexion de l'application ; la base réelle
+n'est pas modifiée (tout se passe dans le schéma jetable).
+
+    python benchmark/check_indexes.py [--etudiants 13000] [--garder]
+"""
+import argparse
+import logging
+import os
+import sys
+
+SCHEMA = 'verif_index'
+
+# Toutes les connexions (pool, migrations) travaillent dans le schéma jetable
+os.environ['PGOPTIONS'] = f"{os.environ.get('PGOPTIONS', '')} -c search_path={SCHEMA},public".strip()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
+import queries
+from db_utils import get_connection, release_connection
+from instrumentation import capture_queries, logger
+from migrations import apply_migrations
+
+LARGE_TABLE_ROWS = 2000  # au-delà, un Seq Scan dans un helper sélectif est signalé
+
+SEED_SQL = """
+INSERT INTO DEPARTEMENT (nom, code)
+SELECT 'Département ' || g, 'D' || g FROM generate_series(1, 7) g;
+
+INSERT INTO FORMATION (nom, niveau, id_dept)
+SELECT 'Formation ' || d || ' ' || n, n, d
+FROM generate_series(1, 7) d, unnest(ARRAY['L1', 'L2', 'L3', 'M1', 'M2']) n;
+
+INSERT INTO ETUDIANT (nom, prenom, email, promo, id_form)
+SELECT 'Nom' || g, 'Prenom' || g, 'etu' || g || '@etu.dz', '2025', 1 + g %% 35
+FROM generate_series(1, %(etudiants)s) g;
+
+INSERT INTO MODULE (nom, credits, coefficient, id_form)
+SELECT 'Module ' || g, 4, 1.5, 1 + g %% 35 FROM generate_series(1, 35 * 8) g;
+
+INSERT INTO INSCRIPTION (id_etu, id_mod, statut)
+SELECT e.id_etu, m.id_mod, 'inscrit'
+FROM ETUDIANT e JOIN MODULE m ON m.id_form = e.id_form;
+
+INSERT INTO PROFESSEUR (nom, prenom, email, specialite, id_dept)
+SELECT 'Prof' || g, 'P' || g, 'prof' || g || '@univ.dz', 'Spécialité', 1 + g %% 7
+FROM generate_series(1, 300) g;
+
+INSERT INTO LIEU_EXAMEN (nom, capacite, type_lieu, batiment)
+SELECT 'Salle ' || g, (ARRAY[30, 40, 60, 120, 250, 300])[1 + g %% 6], 'salle', 'Bloc ' || (1 + g %% 4)
+FROM generate_series(1, 60) g;
+
+-- Un examen par module et par session, une salle par jour (pas de chevauchement)
+INSERT INTO EXAMEN (date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu)
+SELECT TIMESTAMP '2026-01-19 09:00' + ((m.id_mod / 60) + s * 14) * INTERVAL '1 day',
+       90, 'écrit', 'S' || s, m.id_mod, 1 + m.id_mod %% 60
+FROM MODULE m, generate_series(1, 2) s;
+
+INSERT INTO SURVEILLANCE (id_prof, id_exam, role)
+SELECT 1 + (e.id_exam * 2) %% 300, e.id_exam, 'principal' FROM EXAMEN e
+UNION ALL
+SELECT 1 + (e.id_exam * 2 + 1) %% 300, e.id_exam, 'assistant' FROM EXAMEN e;
+
+-- Publication du planning (comme save_planning_to_db)
+SELECT rafraichir_planning_etudiants(NULL);
+
+INSERT INTO UTILISATEURS (username, password_hash, role, nom, prenom, email)
+SELECT 'etu' || g, md5('x'), 'etudiant', 'Nom' || g, 'Prenom' || g, 'ETU' || g || '@etu.dz'
+FROM generate_series(1, %(etudiants)s) g
+UNION ALL
+SELECT 'prof' || g, md5('x'), 'professeur', 'Prof' || g, 'P' || g, 'prof' || g || '@univ.dz'
+FROM generate_series(1, 300) g;
+
+ANALYZE;
+"""
+
+
+def run_sql(sql, params=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    conn.commit()
+    cur.close()
+    release_connection(conn)
+
+
+def plan_scans(node, found):
+    """(type de noeud, table, index) de tous les parcours du plan"""
+    # Bitmap Index Scan : index sans nom de table (porté par le Bitmap Heap Scan parent)
+    if 'Relation Name' in node or 'Index Name' in node:
+        found.append((node['Node Type'], node.get('Relation Name'), node.get('Index Name')))
+    for child in node.get('Plans', []):
+        plan_scans(child, found)
+    return found
+
+
+def explain_helper(cur, func, args):
+    """Exécute le helper (hors cache) et renvoie les parcours de ses requêtes"""
+    if hasattr(func, 'cache_clear'):
+        func.cache_clear()
+    with capture_queries() as captured:
+        func(*args)
+
+    scans = []
+    for sql, params in captured:
+        sql = sql.decode() if isinstance(sql, bytes) else str(sql)
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan_scans(cur.fetchone()[0][0]['Plan'], scans)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--etudiants', type=int, default=13000)
+    parser.add_argument('--garder', action='store_true', help="conserver le schéma jetable")
+    args = parser.parse_args()
+
+    print(f"🔨 Schéma {SCHEMA} : migrations + {args.etudiants} étudiants...")
+    logger.setLevel(logging.ERROR)   # le remplissage est une « requête lente » attendue
+    run_sql(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+    if not apply_migrations():
+        return 1
+    run_sql(SEED_SQL, {'etudiants': args.etudiants})
+    logger.setLevel(logging.NOTSET)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+    SELECT c.relname FROM pg_class c JOIN pg_namespace n ON c.relnamespace = n.oid
+    WHERE n.nspname = %s AND c.relkind = 'r' AND c.reltuples > %s;
+    """, (SCHEMA, LARGE_TABLE_ROWS))
+    large_tables = {row[0] for row in cur.fetchall()}
+
+    cur.execute("SELECT MIN(id_exam) FROM EXAMEN;")
+    id_exam = cur.fetchone()[0]
+
+    # (helper, arguments, sélectif ?)
+    cases = [
+        (queries.get_student_id_from_username, ('etu42',), True),
+        (queries.load_student_own_exams, (42,), True),
+        (queries.load_student_exam_schedule, (42,), True),
+        (queries.get_professor_id_from_username, ('prof7',), True),
+        (queries.load_professor_surveillances, (7,), True),
+        (queries.check_professor_availability, (7, '2026-01-20 09:00'), True),
+        (queries.get_exam_details, (id_exam,), True),
+        (queries.load_exam_schedule, (), False),
+        (queries.load_room_occupancy, (), False),
+        (queries.get_all_modules, (), False),
+        (queries.load_students_by_department, (), False),
+    ]
+
+    failures = 0
+    print(f"\nGrandes tables (> {LARGE_TABLE_ROWS} lignes) : {', '.join(sorted(large_tables))}\n")
+    for func, func_args, selective in cases:
+        scans = explain_helper(cur, func, func_args)
+        indexes = sorted({index for _, _, index in scans if index})
+        seq_scans = sorted({table for node, table, _ in scans
+                            if node == 'Seq Scan' and table in large_tables})
+
+        if not selective:
+            status = "ℹ️ "
+        elif seq_scans:
+            status = "❌"
+            failures += 1
+        else:
+            status = "✅"
+
+        print(f"{status} {func.__name__}")
+        print(f"     index : {', '.join(indexes) or '-'}")
+        if seq_scans:
+            print(f"     Seq Scan : {', '.join(seq_scans)}")
+
+    cur.close()
+    release_connection(conn)
+
+    if not args.garder:
+        run_sql(f"DROP SCHEMA {SCHEMA} CASCADE;")
+
+    print(f"\n{'✅ Tous les helpers sélectifs utilisent des index' if not failures else f'❌ {failures} helper(s) en parcours séquentiel'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# frontend/api.py
+"""
+API JSON en lecture seule : examens d'un étudiant, surveillances d'un professeur
+
+Application ASGI pure (sans framework), à côté de Streamlit : pas de
+websocket, de rerun ni de DataFrame par consultation. Les requêtes SQL
+sont celles des portails (queries.py) ; les réponses portent un ETag et
+un Last-Modified tirés de PLANNING_VERSION (migration 8), le client
+revalide avec If-None-Match / If-Modified-Since et reçoit un 304 tant
+que le planning n'a pas été republié. Les publications sont annoncées
+par NOTIFY (migration 9) : tant que l'écoute est active, une revalidation
+ou une réponse déjà encodée ne touche pas la base.
+
+    GET /moi                             compte authentifié (rôle, id_etu, id_prof)
+    GET /etudiants/<id_etu>/examens      l'étudiant lui-même ou un admin
+    GET /professeurs/<id_prof>/surveillances
+
+Authentification HTTP Basic avec les comptes de l'application (UTILISATEURS).
+
+    uvicorn api:app --app-dir frontend --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import base64
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+
+from cache import bump_tables, get_cache_stats, start_invalidation_listener, tables_version
+from db_utils import get_connection, release_connection, POOL_MAX_SIZE
+from queries import STUDENT_EXAMS_QUERY, PROFESSOR_SURVEILLANCES_QUERY
+from users_db import hash_password, verify_user
+
+API_AUTH_TTL = float(os.getenv('API_AUTH_TTL', 60))              # secondes avant revérification du compte
+API_RESPONSE_CACHE = int(os.getenv('API_RESPONSE_CACHE', 20000))   # réponses encodées gardées en mémoire
+
+# (motif du chemin, clé de la ressource, requête, rôle propriétaire)
+ROUTES = [
+    (re.compile(r'^/etudiants/(\d+)/examens/?$'), 'examens', STUDENT_EXAMS_QUERY, 'etudiant'),
+    (re.compile(r'^/professeurs/(\d+)/surveillances/?$'), 'surveillances', PROFESSOR_SURVEILLANCES_QUERY, 'professeur'),
+]
+
+OWNER_ID = {'etudiant': 'id_etu', 'professeur': 'id_prof'}
+
+
+# ==========================================
+# ACCÈS À LA BASE (threads dédiés)
+# ==========================================
+# psycopg2 est bloquant : les requêtes passent par un pool de threads de la
+# taille du pool de connexions, la boucle asyncio reste libre.
+_executor = ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="api-db")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+# ==========================================
+# VERSION DU PLANNING PUBLIÉ
+# ==========================================
+# Gardée en mémoire tant que l'écoute des invalidations (cache.py) est
+# active : le trigger de PLANNING_VERSION notifie chaque publication.
+# Table enregistrée dès l'import : après une coupure de l'écoute, toutes
+# les versions connues sont incrémentées, celle-ci comprise.
+bump_tables('PLANNING_VERSION')
+_planning = {'versions': None, 'value': None}
+
+
+def _remember_planning(versions, value):
+    _planning['versions'], _planning['value'] = versions, value
+
+
+def _known_planning():
+    """(version, date_maj) sans aller-retour, ou None s'il faut relire la base"""
+    if not get_cache_stats()['ecoute_active']:
+        return None
+    versions, value = _planning['versions'], _planning['value']
+    return value if versions == tables_version('PLANNING_VERSION') else None
+
+
+def _read(query, id_ref, skip_rows):
+    """(version, date_maj, lignes) - lignes None si skip_rows(version) est vrai
+
+    skip_rows : le client ou le cache des réponses a déjà cette version.
+    La version est lue AVANT les données : une réponse n'est jamais plus
+    ancienne que son ETag (au pire plus récente, corrigé à la publication suivante).
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        versions = tables_version('PLANNING_VERSION')
+        cur.execute("SELECT version, date_maj FROM PLANNING_VERSION;")
+        version, date_maj = cur.fetchone()
+        _remember_planning(versions, (version, date_maj))
+
+        rows = None
+        if not skip_rows(version):
+            cur.execute(query, (id_ref,))
+            columns = [col[0] for col in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+
+        cur.close()
+        conn.rollback()   # lecture seule : pas de transaction laissée ouverte
+        release_connection(conn)
+        return version, date_maj, rows
+
+    except Exception as e:
+        print(f"❌ Erreur API lecture planning : {e}")
+        conn.rollback()
+        release_connection(conn)
+        return None
+
+
+# ==========================================
+# COMPTES (HTTP Basic)
+# ==========================================
+# verify_user coûte une requête et une écriture (dernier_login) : le compte
+# vérifié est gardé API_AUTH_TTL secondes, indexé par le hash du mot de passe.
+_accounts = {}
+_accounts_lock = threading.Lock()
+DB_ERROR = object()    # base injoignable pendant la vérification (503, pas 401)
+
+
+def _credentials(header):
+    """(username, password) d'un en-tête Authorization Basic, ou None"""
+    try:
+        scheme, encoded = header.split(' ', 1)
+        username, password = base64.b64decode(encoded).decode().split(':', 1)
+    except ValueError:
+        return None
+    return (username, password) if scheme.lower() == 'basic' else None
+
+
+def _known_account(username, password):
+    with _accounts_lock:
+        entry = _accounts.get((username, hash_password(password)))
+    if entry is not None and time.monotonic() - entry[0] < API_AUTH_TTL:
+        return entry[1]
+    return None
+
+
+def _authenticate(username, password):
+    """Compte, None (identifiants refusés) ou DB_ERROR"""
+    user = verify_user(username, password, on_error=DB_ERROR)
+    if user and user is not DB_ERROR:
+        with _accounts_lock:
+            _accounts[(username, hash_password(password))] = (time.monotonic(), user)
+    return user
+
+
+# ==========================================
+# RÉPONSES ENCODÉES (par ressource et version du planning)
+# ==========================================
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+def _cached_body(key):
+    with _responses_lock:
+        body = _responses.get(key)
+        if body is not None:
+            _responses.move_to_end(key)
+        return body
+
+
+def _store_body(key, body):
+    with _responses_lock:
+        _responses[key] = body
+        _responses.move_to_end(key)
+        while len(_responses) > API_RESPONSE_CACHE:
+            _responses.popitem(last=False)
+
+
+def _not_modified(headers, etag, last_modified):
+    """Validation conditionnelle (If-None-Match prime sur If-Modified-Since)"""
+    if 'if-none-match' in headers:
+        tags = [t.strip() for t in headers['if-none-match'].split(',')]
+        return etag in tags or '*' in tags
+
+    if 'if-modified-since' in headers:
+        try:
+            since = parsedate_to_datetime(headers['if-modified-since'])
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            # Zone "-0000" (ou absente) : date HTTP, donc UTC
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+# ==========================================
+# APPLICATION ASGI
+# ==========================================
+
+async def _send(send, status, body=b"", headers=(), head=False):
+    # 304 : validateurs seuls, sans en-têtes de contenu
+    content = [] if status == 304 else [(b'content-type', b'application/json; charset=utf-8'),
+                                        (b'content-length', str(len(body)).encode())]
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': content + [(k.encode(), v.encode()) for k, v in headers]
+    })
+    await send({'type': 'http.response.body', 'body': b"" if head else body})
+
+
+async def _error(send, status, message, headers=(), head=False):
+    body = json.dumps({'erreur': message}, ensure_ascii=False).encode()
+    await _send(send, status, body, headers, head)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_invalidation_listener()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _validators(version, date_maj):
+    """(etag, last_modified, en-têtes de validation)"""
+    etag = f'"{version}"'
+    last_modified = date_maj.astimezone(timezone.utc)
+    return etag, last_modified, [('etag', etag),
+                                 ('last-modified', format_datetime(last_modified, usegmt=True)),
+                                 ('cache-control', 'private, no-cache')]
+
+
+async def _respond(send, headers, planning, body, head):
+    """304 si le client a cette version, sinon le corps encodé"""
+    etag, last_modified, validators = _validators(*planning)
+    if _not_modified(headers, etag, last_modified):
+        await _send(send, 304, b"", validators, head=True)
+    else:
+        await _send(send, 200, body, validators, head)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method = scope['method']
+    head = method == 'HEAD'
+    if method not in ('GET', 'HEAD'):
+        await _error(send, 405, "Méthode non autorisée", [('allow', 'GET, HEAD')])
+        return
+
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+    loop = asyncio.get_running_loop()
+
+    credentials = _credentials(headers.get('authorization', ''))
+    user = _known_account(*credentials) if credentials else None
+    if credentials and not user:
+        user = await loop.run_in_executor(_executor, _authenticate, *credentials)
+    if user is DB_ERROR:
+        await _error(send, 503, "Base de données indisponible", [('retry-after', '5')], head)
+        return
+    if not user:
+        await _error(send, 401, "Authentification requise",
+                     [('www-authenticate', 'Basic realm="gestion-examens", charset="UTF-8"')], head)
+        return
+
+    path = scope['path']
+    if path.rstrip('/') == '/moi':
+        body = json.dumps({k: user.get(k) for k in ('username', 'role', 'id_etu', 'id_prof')}).encode()
+        await _send(send, 200, body, [('cache-control', 'private, no-store')], head)
+        return
+
+    for pattern, resource, query, owner_role in ROUTES:
+        match = pattern.match(path)
+        if match:
+            break
+    else:
+        await _error(send, 404, "Ressource inconnue", head=head)
+        return
+
+    id_ref = int(match.group(1))
+    if user['role'] != 'admin' and (user['role'] != owner_role or user.get(OWNER_ID[owner_role]) != id_ref):
+        await _error(send, 403, "Accès refusé", head=head)
+        return
+
+    # Version déjà connue (écoute active) : 304 ou réponse encodée sans la base
+    planning = _known_planning()
+    if planning is not None:
+        body = _cached_body((resource, planning[0], id_ref))
+        if body is not None or _not_modified(headers, *_validators(*planning)[:2]):
+            await _respond(send, headers, planning, body, head)
+            return
+
+    # Données relues seulement si ni le client ni le cache n'ont cette version
+    known = headers.get('if-none-match', '').strip().strip('"')
+
+    def skip_rows(version):
+        return known == str(version) or _cached_body((resource, version, id_ref)) is not None
+
+    result = await loop.run_in_executor(_executor, _read, query, id_ref, skip_rows)
+    if result is None:
+        await _error(send, 503, "Base de données indisponible", [('retry-after', '5')], head)
+        return
+
+    version, date_maj, rows = result
+    key = (resource, version, id_ref)
+    body = _cached_body(key)
+    if body is None and rows is None and not _not_modified(headers, *_validators(version, date_maj)[:2]):
+        # Réponse sortie du cache entre-temps : relecture complète
+        result = await loop.run_in_executor(_executor, _read, query, id_ref, lambda v: False)
+        if result is None:
+            await _error(send, 503, "Base de données indisponible", [('retry-after', '5')], head)
+            return
+        version, date_maj, rows = result
+        key = (resource, version, id_ref)
+    if body is None and rows is not None:
+        body = json.dumps({'version': version, resource: rows},
+                          default=_json_default, ensure_ascii=False).encode()
+        _store_body(key, body)
+
+    await _respond(send, headers, (version, date_maj), body, head)
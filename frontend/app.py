@@ -6,13 +6,16 @@ from datetime import datetime, timedelta
 from auth import init_session_state, login_page, logout, require_auth, get_current_user
 from users_db import init_users_table, get_all_users, create_user, delete_user
 from queries import (
-    load_students_by_department,
+    load_students_page,
+    count_students,
+    get_student_filter_options,
+    STUDENTS_PAGE_SIZE,
     load_exams_per_professor,
     load_students_per_module,
     load_exam_schedule,
     load_room_occupancy,
     get_constraint_violations,
-    get_dashboard_stats,
+    get_dashboard_summary_cached,
     get_available_rooms,
     get_all_modules,
     get_all_professors,
@@ -21,8 +24,8 @@ from queries import (
     update_exam,
     delete_exam,
     load_student_own_exams,
-    get_student_id_from_username,
-    get_exam_details, get_all_rooms
+    get_exam_details, get_all_rooms,
+    load_occupancy_index
 )
 from dashboards import (
     chart_students_per_module,
@@ -31,7 +34,18 @@ from dashboards import (
     plotly_exam_timeline,
     plotly_students_per_department
 )
-from db_utils import test_connection, get_connection
+from db_utils import test_connection, database_status
+from migrations import apply_migrations
+from instrumentation import get_query_stats, get_slow_queries, reset_query_stats, SLOW_QUERY_MS
+from cache import get_cache_stats, start_invalidation_listener
+from request_scope import open_request_scope, close_request_scope, load_in_parallel
+from exports import (
+    EXPORT_FORMATS,
+    excel_available,
+    export_students,
+    export_exam_schedule,
+    export_professor_surveillances
+)
 
 st.set_page_config(page_title="Gestion des Examens", page_icon="📚", layout="wide")
 # ==========================================
@@ -66,14 +80,59 @@ st.markdown("""
 # ==========================================
 # INITIALISATION
 # ==========================================
+@st.cache_resource(ttl=600, show_spinner=False)
+def run_startup_tasks():
+    """Test de connexion, migrations et comptes par défaut - une fois par processus serveur
+
+    Mémorisé 10 minutes : les reruns (chaque clic) ne refont plus ces requêtes.
+    En cas d'échec une exception est levée, donc rien n'est mémorisé et la
+    tentative est refaite au rerun suivant.
+    """
+    if not test_connection():
+        raise ConnectionError("PostgreSQL injoignable")
+    if not apply_migrations() or not init_users_table():
+        raise RuntimeError("Initialisation du schéma incomplète")
+    return True
+
+
 init_session_state()
-init_users_table()
 
-# Test connexion DB
-if not test_connection():
-    st.error("❌ Impossible de se connecter à PostgreSQL")
+# Portée du rendu : lectures mémorisées jusqu'à la fin du script, connexion
+# partagée par les helpers imbriqués (fermée aussi en cas de st.stop)
+open_request_scope()
+
+# Test connexion DB + initialisation du schéma
+try:
+    run_startup_tasks()
+except (ConnectionError, RuntimeError) as e:
+    st.error(f"❌ Impossible de se connecter à PostgreSQL ({e})")
+    status = database_status()
+    if status['down']:
+        st.info(f"🔄 Nouvelle tentative automatique dans {status['retry_in']:.0f}s - rechargez la page ensuite")
     st.stop()
 
+# Invalidation des caches quand une autre réplique écrit en base
+start_invalidation_listener()
+
+
+def export_buttons(export, file_stem, key, **kwargs):
+    """Boutons de téléchargement CSV (et Excel si openpyxl est installé)
+
+    L'export n'est lancé qu'au clic (data appelable) et lit la base en flux.
+    """
+    formats = ['csv', 'xlsx'] if excel_available() else ['csv']
+    for col, fmt in zip(st.columns(len(formats)), formats):
+        mime, extension = EXPORT_FORMATS[fmt]
+        with col:
+            st.download_button(
+                label=f"📥 Télécharger en {extension.upper()}",
+                data=lambda fmt=fmt: export(fmt=fmt, **kwargs),
+                file_name=f"{file_stem}.{extension}",
+                mime=mime,
+                key=f"export_{key}_{fmt}",
+                use_container_width=True
+            )
+
 # ==========================================
 # PAGE DE CONNEXION
 # ==========================================
@@ -114,7 +173,8 @@ if user['role'] == 'admin':
         "🤖 Génération Automatique",
         "🏫 Salles",
         "⚠️ Vérification Contraintes",
-        "🔐 Gestion Utilisateurs"
+        "🔐 Gestion Utilisateurs",
+        "⏱️ Performance"
     ]
 elif user['role'] == 'professeur':
     menu_options = [
@@ -142,7 +202,8 @@ st.sidebar.info("💡 **Astuce** : Utilisez les filtres pour affiner vos recherc
 if menu == "🏠 Dashboard" or menu == "🏠 Accueil":
     st.markdown('<p class="main-header">📊 Tableau de Bord</p>', unsafe_allow_html=True)
 
-    stats = get_dashboard_stats()
+    # Tuiles et graphiques : une seule requête (mise en cache)
+    stats = get_dashboard_summary_cached()
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -160,13 +221,11 @@ if menu == "🏠 Dashboard" or menu == "🏠 Accueil":
 
     with col_left:
         st.subheader("📚 Étudiants par module")
-        df_modules = load_students_per_module()
-        chart_students_per_module(df_modules)
+        chart_students_per_module(stats.get('students_per_module', pd.DataFrame()))
 
     with col_right:
         st.subheader("🎓 Répartition par département")
-        df_students = load_students_by_department()
-        plotly_students_per_department(df_students)
+        plotly_students_per_department(stats.get('students_per_department', pd.DataFrame()))
 
 elif menu == "👥 Étudiants":
     if not require_auth(['admin', 'professeur']):
@@ -174,40 +233,55 @@ elif menu == "👥 Étudiants":
 
     st.markdown('<p class="main-header">👥 Gestion des Étudiants</p>', unsafe_allow_html=True)
 
-    df = load_students_by_department()
+    options = get_student_filter_options()
 
-    if not df.empty:
-        col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
 
-        with col1:
-            dept_filter = st.multiselect(
-                "Filtrer par département :",
-                options=df['departement'].unique(),
-                default=df['departement'].unique()
-            )
+    with col1:
+        dept_filter = st.multiselect(
+            "Filtrer par département :",
+            options=options.get('departements', []),
+            placeholder="Tous les départements"
+        )
 
-        with col2:
-            niveau_filter = st.multiselect(
-                "Filtrer par niveau :",
-                options=df['niveau'].unique(),
-                default=df['niveau'].unique()
-            )
+    with col2:
+        niveau_filter = st.multiselect(
+            "Filtrer par niveau :",
+            options=options.get('niveaux', []),
+            placeholder="Tous les niveaux"
+        )
 
-        df_filtered = df[
-            (df['departement'].isin(dept_filter)) &
-            (df['niveau'].isin(niveau_filter))
-            ]
+    with col3:
+        recherche = st.text_input("🔍 Rechercher (nom, prénom, email) :")
 
-        st.markdown(f"**{len(df_filtered)} étudiants trouvés**")
-        st.dataframe(df_filtered, use_container_width=True, height=500)
+    filters = dict(departements=tuple(dept_filter), niveaux=tuple(niveau_filter),
+                   recherche=recherche.strip() or None)
 
-        csv = df_filtered.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Télécharger en CSV",
-            data=csv,
-            file_name="etudiants.csv",
-            mime="text/csv"
-        )
+    # Pagination par clé : pile des clés des pages déjà vues (remise à zéro si les filtres changent)
+    if st.session_state.get('students_filters') != filters:
+        st.session_state.students_filters = filters
+        st.session_state.students_pages = [None]
+
+    pages = st.session_state.students_pages
+    df, next_key = load_students_page(**filters, after=pages[-1])
+    total = count_students(**filters) or len(df)
+
+    if not df.empty:
+        st.markdown(f"**{total} étudiants trouvés** - page {len(pages)} / {max(1, -(-total // STUDENTS_PAGE_SIZE))}")
+        st.dataframe(df.drop(columns=['id_etu']), use_container_width=True, height=500)
+
+        col_prev, col_next = st.columns(2)
+        with col_prev:
+            if st.button("⬅️ Page précédente", disabled=len(pages) == 1, use_container_width=True):
+                pages.pop()
+                st.rerun()
+        with col_next:
+            if st.button("Page suivante ➡️", disabled=next_key is None, use_container_width=True):
+                pages.append(next_key)
+                st.rerun()
+
+        # Export : toutes les lignes filtrées, lues en flux au clic
+        export_buttons(export_students, "etudiants", "etudiants", **filters)
     else:
         st.warning("Aucun étudiant trouvé")
 
@@ -243,15 +317,12 @@ elif menu == "📅 Planning Examens" or menu == "📅 Mes Examens":
         # ==========================================
         st.info(f"👨‍🎓 **{user['prenom']} {user['nom']}** - Vos examens à venir")
 
-        # Récupérer les infos de l'étudiant
-        student_info = get_student_id_from_username(user['username'])
-
-        if student_info:
-            st.markdown(f"**Formation :** {student_info['formation']}")
+        # Dossier étudiant lié au compte (résolu à la connexion) : une seule requête
+        if user.get('id_etu'):
+            st.markdown(f"**Formation :** {user.get('formation') or '-'}")
             st.markdown("---")
 
-            # Charger les examens de l'étudiant
-            df = load_student_own_exams(user['username'])
+            df = load_student_own_exams(user['id_etu'])
 
             if not df.empty:
                 # Statistiques personnelles
@@ -454,6 +525,14 @@ elif menu == "📅 Planning Examens" or menu == "📅 Mes Examens":
 
         if not df.empty:
             st.dataframe(df, use_container_width=True, height=500)
+            export_buttons(export_exam_schedule, "planning_examens", "planning")
+
+            if user['role'] == 'professeur':
+                if user.get('id_prof'):
+                    st.markdown("**👨‍🏫 Mes surveillances**")
+                    export_buttons(export_professor_surveillances, f"surveillances_{user['username']}",
+                                   "surveillances", id_prof=user['id_prof'])
+
             st.markdown("---")
             st.subheader("📆 Timeline des examens")
             plotly_exam_timeline(df)
@@ -466,20 +545,27 @@ elif menu == "📊 Statistiques":
 
     st.markdown('<p class="main-header">📊 Statistiques Détaillées</p>', unsafe_allow_html=True)
 
+    # Les trois onglets sont rendus ensemble : données lues en parallèle
+    data = load_in_parallel(
+        modules=load_students_per_module,
+        salles=load_room_occupancy,
+        examens=load_exam_schedule
+    )
+
     tab1, tab2, tab3 = st.tabs(["📚 Modules", "🏫 Salles", "📅 Examens"])
 
     with tab1:
-        df = load_students_per_module()
+        df = data['modules']
         st.dataframe(df, use_container_width=True)
         chart_students_per_module(df)
 
     with tab2:
-        df = load_room_occupancy()
+        df = data['salles']
         st.dataframe(df, use_container_width=True)
         chart_room_occupancy(df)
 
     with tab3:
-        df = load_exam_schedule()
+        df = data['examens']
         st.dataframe(df, use_container_width=True)
 elif menu == "➕ Planifier un Examen":
     if not require_auth(['admin']):
@@ -487,6 +573,16 @@ elif menu == "➕ Planifier un Examen":
 
     st.markdown('<p class="main-header">➕ Planifier un Nouvel Examen</p>', unsafe_allow_html=True)
 
+    # Préchargement en parallèle : les appels des onglets ci-dessous sont
+    # ensuite servis par la portée du rendu
+    load_in_parallel(
+        modules=get_all_modules,
+        professeurs=get_all_professors,
+        salles=get_all_rooms,
+        occupation=load_occupancy_index,
+        examens=load_exam_schedule
+    )
+
     tab1, tab2, tab3 = st.tabs(["📝 Créer un examen", "✏️ Modifier un examen", "🗑️ Supprimer un examen"])
 
     # ==========================================
@@ -507,14 +603,14 @@ elif menu == "➕ Planifier un Examen":
                 st.markdown("**📚 Informations**")
                 modules = get_all_modules()
                 if modules:
-                    module_options = {f"{m['nom']} ({m['formation']}) - {m['nb_inscrits']} inscrits": m['id_mod']
+                    module_options = {f"{m.nom} ({m.formation}) - {m.nb_inscrits} inscrits": m.id_mod
                                       for m in modules}
                     selected_module = st.selectbox("Module *", options=list(module_options.keys()))
                     id_mod = module_options[selected_module]
 
                     # Afficher le nombre d'inscrits
-                    selected_mod_data = next(m for m in modules if m['id_mod'] == id_mod)
-                    st.info(f"👥 {selected_mod_data['nb_inscrits']} étudiants inscrits à ce module")
+                    selected_mod_data = next(m for m in modules if m.id_mod == id_mod)
+                    st.info(f"👥 {selected_mod_data.nb_inscrits} étudiants inscrits à ce module")
                 else:
                     st.error("❌ Aucun module disponible")
                     id_mod = None
@@ -536,16 +632,16 @@ elif menu == "➕ Planifier un Examen":
 
                     if available_rooms:
                         room_options = {
-                            f"{r['nom']} - {r['type_lieu']} ({r['capacite']} places) - {r['batiment']}": r['id_lieu']
+                            f"{r.nom} - {r.type_lieu} ({r.capacite} places) - {r.batiment}": r.id_lieu
                             for r in available_rooms}
                         selected_room = st.selectbox("Salle disponible *", options=list(room_options.keys()))
                         id_lieu = room_options[selected_room]
 
                         # Warning si capacité insuffisante
-                        selected_room_data = next(r for r in available_rooms if r['id_lieu'] == id_lieu)
-                        if selected_mod_data['nb_inscrits'] > selected_room_data['capacite']:
+                        selected_room_data = next(r for r in available_rooms if r.id_lieu == id_lieu)
+                        if selected_mod_data.nb_inscrits > selected_room_data.capacite:
                             st.warning(
-                                f"⚠️ Attention : {selected_mod_data['nb_inscrits']} inscrits mais seulement {selected_room_data['capacite']} places !")
+                                f"⚠️ Attention : {selected_mod_data.nb_inscrits} inscrits mais seulement {selected_room_data.capacite} places !")
                     else:
                         st.error("❌ Aucune salle disponible pour ce créneau")
                         id_lieu = None
@@ -556,7 +652,7 @@ elif menu == "➕ Planifier un Examen":
                 st.markdown("**👨‍🏫 Surveillance**")
                 profs = get_all_professors()
                 if profs:
-                    prof_options = {f"{p['nom']} {p['prenom']} - {p['specialite']}": p['id_prof']
+                    prof_options = {f"{p.nom} {p.prenom} - {p.specialite}": p.id_prof
                                     for p in profs}
 
                     principal = st.selectbox("Surveillant principal *", options=list(prof_options.keys()))
@@ -628,7 +724,7 @@ elif menu == "➕ Planifier un Examen":
                 # Sélection de la nouvelle salle
                 available_rooms = get_available_rooms(f"{new_date} {new_time}", new_duree)
                 if available_rooms:
-                    room_options = {f"{r['nom']} ({r['capacite']} places)": r['id_lieu'] for r in available_rooms}
+                    room_options = {f"{r.nom} ({r.capacite} places)": r.id_lieu for r in available_rooms}
                     new_room = st.selectbox("Nouvelle salle", options=list(room_options.keys()))
                     new_id_lieu = room_options[new_room]
                 else:
@@ -762,70 +858,37 @@ elif menu == "🤖 Génération Automatique":
             with col2:
                 st.subheader("📊 Aperçu de la sélection")
 
-                # Récupérer les modules et étudiants concernés
-                conn = get_connection()
-                if conn:
-                    cur = conn.cursor()
-
-                    # Compter les formations concernées
-                    cur.execute("""
-                        SELECT f.id_form, f.nom, f.niveau, COUNT(e.id_etu) as nb_etudiants
-                        FROM FORMATION f
-                        LEFT JOIN ETUDIANT e ON f.id_form = e.id_form
-                        WHERE f.id_dept = %s AND f.niveau = ANY(%s)
-                        GROUP BY f.id_form, f.nom, f.niveau
-                        ORDER BY f.niveau;
-                        """, (id_dept, niveaux_list))
-
-                    formations_info = cur.fetchall()
-
-                    if formations_info:
-                        st.success(f"**{dept_selected} - {niveau_selected}**")
-
-                        total_etudiants = sum(f[3] for f in formations_info)
-                        total_formations = len(formations_info)
-
-                        st.metric("👥 Étudiants concernés", total_etudiants)
-                        st.metric("📚 Formations", total_formations)
-
-                        # Compter les modules
-                        cur.execute("""
-                            SELECT COUNT(DISTINCT m.id_mod)
-                            FROM MODULE m
-                            JOIN FORMATION f ON m.id_form = f.id_form
-                            WHERE f.id_dept = %s AND f.niveau = ANY(%s);
-                            """, (id_dept, niveaux_list))
-
-                        nb_modules = cur.fetchone()[0]
-                        st.metric("📖 Modules à planifier", nb_modules)
-
-                        # Afficher le détail
-                        with st.expander("📋 Détail des formations"):
-                            for f in formations_info:
-                                st.write(f"- **{f[1]}** ({f[2]}) : {f[3]} étudiants")
-                    else:
-                        st.warning("Aucune formation trouvée pour cette sélection")
+                # Même instantané que celui utilisé par la génération
+                from scheduler_engine import load_planning_snapshot
 
-                    cur.close()
-                    conn.close()
+                snapshot = load_planning_snapshot(id_dept, niveaux_list)
+                formations_info = snapshot['formations'] if snapshot else ()
 
-                # Statistiques salles et profs
-                salles = get_all_rooms()
-
-                # Filtrer les profs du département
-                conn = get_connection()
-                if conn:
-                    cur = conn.cursor()
-                    cur.execute("""
-                        SELECT COUNT(*) FROM PROFESSEUR WHERE id_dept = %s;
-                        """, (id_dept,))
-                    nb_profs = cur.fetchone()[0]
-                    cur.close()
-                    conn.close()
+                if formations_info:
+                    st.success(f"**{dept_selected} - {niveau_selected}**")
+
+                    total_etudiants = sum(f[3] for f in formations_info)
+                    total_formations = len(formations_info)
+
+                    st.metric("👥 Étudiants concernés", total_etudiants)
+                    st.metric("📚 Formations", total_formations)
+
+                    # Compter les modules
+                    nb_modules = sum(f[4] for f in formations_info)
+                    st.metric("📖 Modules à planifier", nb_modules)
+
+                    # Afficher le détail
+                    with st.expander("📋 Détail des formations"):
+                        for f in formations_info:
+                            st.write(f"- **{f[1]}** ({f[2]}) : {f[3]} étudiants")
                 else:
-                    nb_profs = 0
+                    st.warning("Aucune formation trouvée pour cette sélection")
+
+                # Statistiques salles et profs
+                nb_salles = len(snapshot['salles']) if snapshot else 0
+                nb_profs = len(snapshot['professeurs']) if snapshot else 0
 
-                st.metric("🏫 Salles disponibles", len(salles))
+                st.metric("🏫 Salles disponibles", nb_salles)
                 st.metric(f"👨‍🏫 Professeurs {dept_selected}", nb_profs)
                 st.metric("📅 Créneaux possibles", nb_jours * 2)
 
@@ -907,7 +970,7 @@ elif menu == "🤖 Génération Automatique":
                 df_display = df_planning.copy()
                 df_display['date_exam'] = pd.to_datetime(df_display['date_exam']).dt.strftime('%d/%m/%Y %H:%M')
                 df_display['surveillants_noms'] = df_display['surveillants'].apply(
-                    lambda surv: ', '.join([f"{s[1]} {s[2]}" for s in surv]) if surv else 'Aucun'
+                    lambda surv: ', '.join([f"{s.nom} {s.prenom}" for s in surv]) if surv else 'Aucun'
                 )
 
                 # Afficher le tableau
@@ -1056,9 +1119,77 @@ elif menu == "🔐 Gestion Utilisateurs":
                 else:
                     st.warning("⚠️ Tous les champs sont obligatoires")
 
+elif menu == "⏱️ Performance":
+    if not require_auth(['admin']):
+        st.stop()
+
+    st.markdown('<p class="main-header">⏱️ Performance des Requêtes</p>', unsafe_allow_html=True)
+
+    cache_stats = get_cache_stats()
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("🗃️ Résultats en cache", cache_stats['entrees'])
+    col2.metric("🎯 Taux de succès du cache", f"{cache_stats['hits'] / lookups:.0%}" if lookups else "-")
+    col3.metric("💾 Mémoire du cache", f"{cache_stats['octets'] / 1024 / 1024:.1f} Mo")
+    if not cache_stats['ecoute_active']:
+        st.warning("⚠️ Écoute des invalidations (LISTEN/NOTIFY) inactive : les écritures des autres serveurs ne sont visibles qu'après expiration du cache")
+
+    st.subheader("📈 Temps de réponse par fonction")
+    stats = get_query_stats()
+
+    if stats:
+        df_stats = pd.DataFrame(stats)
+        st.dataframe(
+            df_stats,
+            use_container_width=True,
+            column_config={
+                "fonction": "Fonction",
+                "appels": "Appels",
+                "p50_ms": st.column_config.NumberColumn("p50", format="%.1f ms"),
+                "p95_ms": st.column_config.NumberColumn("p95", format="%.1f ms"),
+                "max_ms": st.column_config.NumberColumn("Max", format="%.1f ms"),
+                "lignes_moy": "Lignes (moy.)",
+                "octets_moy": "Octets (moy.)",
+                "erreurs": "Erreurs"
+            }
+        )
+
+        fig = px.bar(
+            df_stats.head(15).sort_values('p95_ms'),
+            x=['p50_ms', 'p95_ms'],
+            y='fonction',
+            orientation='h',
+            barmode='group',
+            title="⏱️ p50 / p95 par fonction (ms)",
+            labels={'value': 'Durée (ms)', 'fonction': 'Fonction', 'variable': ''}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Aucune mesure pour le moment")
+
+    st.markdown("---")
+    st.subheader("🐢 Requêtes lentes")
+    st.caption(f"Requêtes de plus de {SLOW_QUERY_MS:.0f} ms (variable SLOW_QUERY_MS), avec leur plan d'exécution")
+
+    slow_queries = get_slow_queries()
+    if slow_queries:
+        for q in slow_queries:
+            with st.expander(f"🐢 {q['name']} - {q['duree_ms']} ms - {q['date']}"):
+                st.code(q['requete'], language='sql')
+                if q['plan']:
+                    st.code(q['plan'])
+    else:
+        st.success("✅ Aucune requête lente")
+
+    if st.button("🔄 Réinitialiser les mesures"):
+        reset_query_stats()
+        st.rerun()
+
 # ==========================================
 # FOOTER
 # ==========================================
 st.sidebar.markdown("---")
 st.sidebar.markdown("**🎓 Système de Gestion d'Examens**")
-st.sidebar.markdown("Version 1.0 - Décembre 2025")
\ No newline at end of file
+st.sidebar.markdown("Version 1.0 - Décembre 2025")
+
+close_request_scope()
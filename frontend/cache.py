@@ -0,0 +1,283 @@
+# frontend/cache.py
+import json
+import os
+import select
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+import psycopg2
+import streamlit as st
+
+from db_utils import database_status, _connection_params
+from request_scope import MISSING, memo_get, memo_put
+
+CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_ENTRIES', 256))
+CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MB', 64)) * 1024 * 1024
+CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 600))   # filet de sécurité (écritures hors application)
+
+NOTIFY_CHANNEL = 'gestion_examens_invalidation'
+ORIGIN = uuid.uuid4().hex          # identifiant de ce processus (réplique)
+LISTEN_RECONNECT_DELAY = 5         # secondes
+
+
+# ==========================================
+# VERSIONS DES TABLES
+# ==========================================
+# Chaque écriture incrémente la version des tables touchées : seuls les
+# résultats qui lisent ces tables deviennent obsolètes.
+_versions_lock = threading.Lock()
+_table_versions = {}
+
+
+def tables_version(*tables):
+    """Versions courantes des tables (tuple, même ordre que les arguments)"""
+    return tuple(_table_versions.get(t.upper(), 0) for t in tables)
+
+
+def bump_tables(*tables):
+    """Signale une écriture sur ces tables"""
+    with _versions_lock:
+        for t in tables:
+            t = t.upper()
+            _table_versions[t] = _table_versions.get(t, 0) + 1
+
+
+# ==========================================
+# CACHE LRU DES RÉSULTATS
+# ==========================================
+
+def _freeze(value):
+    """Rend les arguments hashables (listes -> tuples, ...) pour la clé du cache"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _sizeof(value):
+    """Taille approximative d'un résultat en mémoire"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (list, tuple)) and value:
+        return sys.getsizeof(value) + len(value) * sys.getsizeof(value[0])
+    return sys.getsizeof(value)
+
+
+class _QueryFailed:
+    __slots__ = ('fallback',)
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+
+def query_failed(fallback):
+    """Valeur de repli d'un helper en erreur (connexion ou requête échouée)
+
+    cached_query ne la met jamais en cache : l'appelant reçoit la dernière
+    valeur connue s'il y en a une, sinon fallback.
+    """
+    return _QueryFailed(fallback)
+
+
+class ResultCache:
+    """Cache LRU borné (nombre d'entrées et octets) partagé par toutes les sessions"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # clé -> (versions, date, valeur, taille)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, versions, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[3]
+
+            self._entries[key] = (versions, time.monotonic(), value, size)
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[3]
+
+    def clear(self, prefix=None):
+        """Vide le cache (ou seulement les entrées d'une fonction)"""
+        with self._lock:
+            for key in [k for k in self._entries if prefix is None or k[0] == prefix]:
+                self.bytes -= self._entries.pop(key)[3]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entrees': len(self._entries),
+                'octets': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hits_obsoletes': self.stale_hits
+            }
+
+
+_cache = ResultCache()
+
+
+def cached_query(*tables, ttl=CACHE_TTL):
+    """Met en cache le résultat d'un helper de lecture, par fonction et arguments
+
+    L'entrée reste valide tant que la version des tables lues ne change pas
+    (et au plus ttl secondes). Si la base est indisponible ou si le helper
+    renvoie query_failed(...), la dernière valeur connue est servie même
+    obsolète. Pendant un rendu, le résultat est aussi mémorisé dans la
+    portée (request_scope) : les appels suivants ne repassent ni par le
+    cache ni par la base.
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, _freeze(args), _freeze(kwargs))
+            versions = tables_version(*tables)
+
+            value = memo_get((key, versions))
+            if value is not MISSING:
+                return value
+
+            entry = _cache.get(key)
+
+            if entry is not None:
+                fresh = entry[0] == versions and time.monotonic() - entry[1] < ttl
+                if fresh or database_status()['down']:
+                    _cache.hits += 1
+                    if not fresh:
+                        _cache.stale_hits += 1
+                    value = entry[2]
+                    memo_put((key, versions), value)
+                    # Copie superficielle : ajouter une colonne ne modifie pas le cache
+                    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+            _cache.misses += 1
+            value = func(*args, **kwargs)
+            if isinstance(value, _QueryFailed):
+                if entry is None:
+                    return value.fallback
+                _cache.stale_hits += 1
+                value = entry[2]
+                return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+            if not database_status()['down']:
+                _cache.put(key, versions, value)
+                memo_put((key, versions), value)
+                if isinstance(value, pd.DataFrame):
+                    return value.copy(deep=False)
+            return value
+
+        wrapper.cache_clear = lambda: _cache.clear(name)
+        return wrapper
+
+    return decorator
+
+
+def get_cache_stats():
+    stats = _cache.stats()
+    stats['ecoute_active'] = _listener_connected.is_set()
+    return stats
+
+
+# ==========================================
+# INVALIDATION ENTRE RÉPLIQUES (LISTEN/NOTIFY)
+# ==========================================
+# Plusieurs serveurs Streamlit partagent la base : chaque écriture émet un
+# NOTIFY dans sa transaction (livré seulement si elle est validée) et chaque
+# réplique écoute le canal pour invalider ses propres caches.
+_listener_connected = threading.Event()
+
+
+def notify_tables(cur, *tables, key=None):
+    """Annonce aux autres répliques une écriture sur ces tables (avant le commit)"""
+    payload = json.dumps({
+        'tables': [t.upper() for t in tables],
+        'key': key,
+        'origin': ORIGIN
+    }, default=str)
+    cur.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, payload))
+
+
+def _invalidate_all():
+    """Notifications peut-être perdues (déconnexion) : tout le cache est obsolète"""
+    with _versions_lock:
+        for t in _table_versions:
+            _table_versions[t] += 1
+    _cache.clear()
+
+
+def _handle_notification(payload):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return
+
+    if message.get('origin') != ORIGIN:
+        bump_tables(*message.get('tables', []))
+
+
+def _listen_loop(dsn, options):
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn, **options)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL};")
+
+            # Écritures manquées pendant la coupure : repartir d'un cache vide
+            if not _listener_connected.is_set():
+                _invalidate_all()
+            _listener_connected.set()
+
+            while True:
+                if select.select([conn], [], [], LISTEN_RECONNECT_DELAY) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _handle_notification(conn.notifies.pop(0).payload)
+
+        except Exception as e:
+            if _listener_connected.is_set():
+                print(f"⚠️ Écoute des invalidations interrompue : {e}")
+            _listener_connected.clear()
+            if conn is not None and not conn.closed:
+                conn.close()
+            time.sleep(LISTEN_RECONNECT_DELAY)
+
+
+@st.cache_resource(show_spinner=False)
+def start_invalidation_listener():
+    """Démarre (une fois par processus) l'écoute des invalidations des autres répliques"""
+    dsn, options, _ = _connection_params()
+    thread = threading.Thread(target=_listen_loop, args=(dsn, options),
+                              name="cache-invalidation-listener", daemon=True)
+    thread.start()
+    return thread
@@ -115,12 +115,19 @@ def plotly_exam_timeline(df):
 
 
 def plotly_students_per_department(df):
-    """Graphique circulaire : Répartition des étudiants"""
+    """Graphique circulaire : Répartition des étudiants
+
+    Accepte la liste des étudiants (une ligne par étudiant) ou les effectifs
+    déjà agrégés par le serveur (colonnes departement, nb_etudiants).
+    """
     if df.empty:
         st.warning("Aucune donnée disponible")
         return
 
-    dept_count = df.groupby('departement').size().reset_index(name='count')
+    if 'nb_etudiants' in df.columns:
+        dept_count = df.rename(columns={'nb_etudiants': 'count'})
+    else:
+        dept_count = df.groupby('departement').size().reset_index(name='count')
 
     fig = px.pie(
         dept_count,
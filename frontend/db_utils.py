@@ -1,106 +1,340 @@
 # frontend/db_utils.py
 import streamlit as st
 import psycopg2
-from psycopg2 import Error, OperationalError
+from psycopg2 import Error, OperationalError, extensions
+from contextlib import contextmanager
+import threading
+import random
 import time
 import os
 
+from instrumentation import InstrumentedCursor
+from request_scope import acquire_scoped_connection, release_scoped_connection
 
-def get_connection(retry=3):
+
+# ==========================================
+# POOL DE CONNEXIONS (un par processus serveur)
+# ==========================================
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN', 1))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX', 10))
+POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))   # secondes
+POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))      # secondes
+POOL_HEALTH_CHECK_IDLE = 30   # ping (SELECT 1) si la connexion dort depuis plus longtemps
+
+KEEPALIVES = dict(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=5)
+
+# Toutes les requêtes passent par le curseur instrumenté (durée, lignes, requêtes lentes)
+CURSOR = dict(cursor_factory=InstrumentedCursor)
+
+
+def _connection_params():
     """
-    Connexion à PostgreSQL avec retry automatique
+    Paramètres de connexion : (dsn, options, source)
     Compatible avec : Neon, Supabase, Render, localhost
     """
+    # PRIORITÉ 1 : Streamlit Secrets (Cloud)
+    if hasattr(st, 'secrets') and 'database' in st.secrets:
+
+        # Méthode A : URL complète (Neon, Render)
+        if 'url' in st.secrets['database']:
+            return (st.secrets['database']['url'],
+                    dict(connect_timeout=15, **KEEPALIVES, **CURSOR),
+                    "URL Streamlit Secrets")
+
+        # Méthode B : Paramètres séparés
+        return (None, dict(
+            host=st.secrets['database']['host'],
+            database=st.secrets['database']['database'],
+            user=st.secrets['database']['user'],
+            password=st.secrets['database']['password'],
+            port=st.secrets['database'].get('port', '5432'),
+            sslmode=st.secrets['database'].get('sslmode', 'require'),
+            connect_timeout=15,
+            **KEEPALIVES,
+            **CURSOR
+        ), "paramètres Streamlit Secrets")
+
+    # PRIORITÉ 2 : Variables d'environnement
+    if os.getenv('DATABASE_URL'):
+        return os.getenv('DATABASE_URL'), dict(connect_timeout=15, **KEEPALIVES, **CURSOR), "DATABASE_URL"
+
+    # PRIORITÉ 3 : Localhost (développement local)
+    return (None, dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'gestion_examens_db'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'rekaya22'),
+        port=os.getenv('DB_PORT', '5432'),
+        connect_timeout=10,
+        **CURSOR
+    ), "locale")
+
+
+class ConnectionPool:
+    """Pool de connexions PostgreSQL thread-safe partagé par toutes les sessions
+
+    - DB_POOL_MIN connexions ouvertes d'avance, au plus DB_POOL_MAX
+    - toute connexion rendue saine reste ouverte pour l'emprunt suivant
+      (jusqu'à DB_POOL_MAX connexions inactives, réutilisées de la plus
+      récente à la plus ancienne)
+    - attente bornée quand toutes les connexions sont prises
+    - contrôle de santé à l'emprunt (connexion fermée, trop ancienne ou inactive)
+    """
+
+    def __init__(self, dsn, options, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE,
+                 max_lifetime=POOL_MAX_LIFETIME):
+        self._dsn = dsn
+        self._options = options
+        self._idle = []        # connexions libres (la dernière rendue à la fin)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # Indexés par la connexion elle-même, nettoyés à chaque fermeture (_discard)
+        self._born = {}        # conn -> date de création
+        self._returned = {}    # conn -> date du dernier retour au pool
+        self.max_lifetime = max_lifetime
+
+        for _ in range(min(minconn, maxconn)):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(self._dsn, **self._options)
+        with self._lock:
+            self._born[conn] = time.monotonic()
+        return conn
+
+    def _is_healthy(self, conn):
+        now = time.monotonic()
 
-    for attempt in range(retry):
+        if conn.closed or now - self._born.get(conn, now) > self.max_lifetime:
+            return False
+
+        if now - self._returned.get(conn, now) > POOL_HEALTH_CHECK_IDLE:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1;")
+                cur.close()
+                conn.rollback()
+            except Error:
+                return False
+
+        return True
+
+    def _discard(self, conn):
+        with self._lock:
+            self._born.pop(conn, None)
+            self._returned.pop(conn, None)
         try:
-            # PRIORITÉ 1 : Streamlit Secrets (Cloud)
-            if hasattr(st, 'secrets') and 'database' in st.secrets:
-
-                # Méthode A : URL complète (Neon, Render)
-                if 'url' in st.secrets['database']:
-                    conn = psycopg2.connect(
-                        st.secrets['database']['url'],
-                        connect_timeout=15,
-                        keepalives=1,
-                        keepalives_idle=30,
-                        keepalives_interval=10,
-                        keepalives_count=5
-                    )
-                    if attempt == 0:
-                        print(f"✅ Connexion via URL Streamlit Secrets")
-                    return conn
+            conn.close()
+        except Error:
+            pass
+
+    def getconn(self, timeout=POOL_CHECKOUT_TIMEOUT):
+        """Emprunte une connexion saine (None si le pool reste saturé)"""
+        if not self._slots.acquire(timeout=timeout):
+            return None
 
-                # Méthode B : Paramètres séparés
-                else:
-                    conn = psycopg2.connect(
-                        host=st.secrets['database']['host'],
-                        database=st.secrets['database']['database'],
-                        user=st.secrets['database']['user'],
-                        password=st.secrets['database']['password'],
-                        port=st.secrets['database'].get('port', '5432'),
-                        sslmode=st.secrets['database'].get('sslmode', 'require'),
-                        connect_timeout=15,
-                        keepalives=1,
-                        keepalives_idle=30,
-                        keepalives_interval=10,
-                        keepalives_count=5
-                    )
-                    if attempt == 0:
-                        print(f"✅ Connexion via paramètres Streamlit Secrets")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if self._is_healthy(conn):
                     return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion au pool (transaction en cours annulée)"""
+        try:
+            if close or conn.closed:
+                self._discard(conn)
+                return
+
+            try:
+                if conn.status != extensions.STATUS_READY:
+                    conn.rollback()
+            except Error:
+                self._discard(conn)
+                return
+
+            with self._lock:
+                self._returned[conn] = time.monotonic()
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool():
+    """Pool unique par processus serveur Streamlit (créé au premier appel)"""
+    dsn, options, source = _connection_params()
+    connection_pool = ConnectionPool(dsn, options)
+    print(f"✅ Pool de connexions créé ({source}, {POOL_MIN_SIZE}-{POOL_MAX_SIZE} connexions)")
+    return connection_pool
+
+
+# ==========================================
+# ÉTAT DE LA BASE (disjoncteur)
+# ==========================================
+BACKOFF_BASE = 1.0    # secondes
+BACKOFF_MAX = 30.0    # secondes
 
-            # PRIORITÉ 2 : Variables d'environnement
-            elif os.getenv('DATABASE_URL'):
-                conn = psycopg2.connect(
-                    os.getenv('DATABASE_URL'),
-                    connect_timeout=15,
-                    keepalives=1,
-                    keepalives_idle=30,
-                    keepalives_interval=10,
-                    keepalives_count=5
-                )
-                if attempt == 0:
-                    print(f"✅ Connexion via DATABASE_URL")
-                return conn
-
-            # PRIORITÉ 3 : Localhost (développement local)
-            else:
-                conn = psycopg2.connect(
-                    host=os.getenv('DB_HOST', 'localhost'),
-                    database=os.getenv('DB_NAME', 'gestion_examens_db'),
-                    user=os.getenv('DB_USER', 'postgres'),
-                    password=os.getenv('DB_PASSWORD', 'rekaya22'),
-                    port=os.getenv('DB_PORT', '5432'),
-                    connect_timeout=10
-                )
-                if attempt == 0:
-                    print(f"✅ Connexion locale")
-                return conn
-
-        except OperationalError as e:
-            error_msg = str(e)
-
-            if any(x in error_msg.lower() for x in
-                   ['password', 'authentication', 'role', 'database', 'does not exist']):
-                st.error(f"❌ Erreur de configuration : {e}")
-                return None
-
-            if attempt < retry - 1:
-                wait_time = (attempt + 1) * 2
-                print(f"⚠️ Tentative {attempt + 1}/{retry} échouée. Nouvelle tentative dans {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            else:
-                st.error(f"❌ Impossible de se connecter après {retry} tentatives")
-                st.error(f"Détails : {e}")
-                return None
-
-        except Exception as e:
-            st.error(f"❌ Erreur inattendue : {e}")
+CONFIG_ERRORS = ['password', 'authentication', 'role', 'database', 'does not exist']
+
+
+class DatabaseHealth:
+    """Disjoncteur partagé par toutes les sessions du processus
+
+    Après un échec de connexion la base est marquée « indisponible » :
+    get_connection() échoue immédiatement au lieu de bloquer la page.
+    Un seul thread de sonde, en arrière-plan, retente la connexion avec un
+    délai exponentiel aléatoire (jitter) et referme le disjoncteur dès que
+    la base répond (réveil d'un Postgres serverless par exemple).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probe = None
+        self.down_since = None
+        self.retry_at = 0.0
+        self.failures = 0
+        self.last_error = None
+
+    def is_down(self):
+        return self.down_since is not None
+
+    def status(self):
+        return {
+            'down': self.is_down(),
+            'retry_in': max(0.0, self.retry_at - time.monotonic()) if self.is_down() else 0.0,
+            'failures': self.failures,
+            'last_error': self.last_error
+        }
+
+    def _backoff(self):
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.failures))
+
+    def record_success(self):
+        if not self.is_down():
+            return
+        with self._lock:
+            if self.down_since is not None:
+                print(f"✅ Base de nouveau disponible après {time.monotonic() - self.down_since:.0f}s")
+            self.down_since = None
+            self.failures = 0
+            self.last_error = None
+
+    def record_failure(self, error):
+        """Ouvre le disjoncteur et lance la sonde si elle ne tourne pas déjà"""
+        with self._lock:
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+            self.failures += 1
+            self.last_error = str(error).strip()
+            self.retry_at = time.monotonic() + self._backoff()
+
+            if self._probe is None or not self._probe.is_alive():
+                self._probe = threading.Thread(target=self._probe_loop, name="db-warmup-probe", daemon=True)
+                self._probe.start()
+
+    def _probe_loop(self):
+        dsn, options, _ = _connection_params()
+
+        while self.is_down():
+            time.sleep(max(0.0, self.retry_at - time.monotonic()))
+            try:
+                conn = psycopg2.connect(dsn, **options)
+                conn.close()
+                self.record_success()
+            except Error as e:
+                print(f"⚠️ Base toujours indisponible (tentative {self.failures}) : {e}".strip())
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = str(e).strip()
+                    self.retry_at = time.monotonic() + self._backoff()
+
+
+_health = DatabaseHealth()
+
+
+def database_status():
+    """État du disjoncteur : {'down', 'retry_in', 'failures', 'last_error'}"""
+    return _health.status()
+
+
+def get_connection():
+    """
+    Emprunte une connexion au pool - échoue immédiatement si la base est indisponible
+    La connexion doit être rendue avec release_connection() (ou utiliser db_connection())
+    Pendant un rendu (request_scope), la même connexion est prêtée à chaque appel.
+    """
+    if _health.is_down():
+        return None
+
+    try:
+        conn = acquire_scoped_connection(_borrow, _give_back)
+        if conn is None:
+            conn = _borrow()
+        if conn is None:
+            st.error("❌ Trop de connexions simultanées, réessayez dans un instant")
+        return conn
+
+    except OperationalError as e:
+        error_msg = str(e)
+
+        if any(x in error_msg.lower() for x in CONFIG_ERRORS):
+            st.error(f"❌ Erreur de configuration : {e}")
             return None
 
-    return None
+        # Réessais en arrière-plan : la page n'attend pas
+        _health.record_failure(e)
+        print(f"⚠️ Connexion impossible, nouvelle tentative en arrière-plan : {e}".strip())
+        st.error("❌ Base de données indisponible, nouvelle tentative automatique en cours")
+        st.error(f"Détails : {e}")
+        return None
+
+    except Exception as e:
+        st.error(f"❌ Erreur inattendue : {e}")
+        return None
+
+
+def _borrow():
+    return get_pool().getconn()
+
+
+def _give_back(conn, close=False):
+    get_pool().putconn(conn, close=close)
+
+
+def release_connection(conn, close=False):
+    """Rend une connexion au pool (close=True : la détruire au lieu de la réutiliser)"""
+    if not release_scoped_connection(conn, close):
+        _give_back(conn, close)
+
+
+@contextmanager
+def db_connection():
+    """Connexion empruntée au pool et rendue automatiquement en sortie de bloc
+
+        with db_connection() as conn:
+            if conn:
+                ...
+    """
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            release_connection(conn)
 
 
 def test_connection():
@@ -108,7 +342,7 @@ def test_connection():
     conn = get_connection()
     if conn:
         print("✅ Connexion PostgreSQL réussie")
-        conn.close()
+        release_connection(conn)
         return True
     return False
 
@@ -150,4 +384,4 @@ def show_connection_config():
 
         **Host:** `localhost`  
         **Database:** `gestion_examens_db`
-        """)
\ No newline at end of file
+        """)
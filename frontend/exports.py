@@ -0,0 +1,117 @@
+# frontend/exports.py
+import tempfile
+import uuid
+
+from db_utils import get_connection, release_connection
+from instrumentation import timed_query
+from queries import EXAM_SCHEDULE_QUERY, PROFESSOR_SURVEILLANCES_QUERY, students_query
+
+# openpyxl (requirements.txt) : s'il manque, seul l'export CSV est proposé
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+EXPORT_CHUNK_ROWS = 2000                  # lignes lues par aller-retour (curseur serveur)
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024      # au-delà, le fichier produit passe sur disque
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+
+def excel_available():
+    return Workbook is not None
+
+
+# ==========================================
+# ÉCRITURE EN FLUX
+# ==========================================
+# Les lignes vont directement de PostgreSQL vers un fichier temporaire
+# (en mémoire jusqu'à EXPORT_SPOOL_BYTES, puis sur disque) : pas de
+# DataFrame intermédiaire ni de liste de toutes les lignes pendant la
+# lecture. En revanche st.download_button lit le fichier produit en
+# entier : le serveur garde une copie du fichier en mémoire le temps du
+# téléchargement (taille du CSV / XLSX, bien moindre qu'une DataFrame).
+
+def _copy_csv(conn, query, params, spool):
+    """COPY (requête) TO STDOUT : le CSV est produit par le serveur"""
+    cur = conn.cursor()
+    sql = cur.mogrify(query.strip().rstrip(';'), params).decode()
+    cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT CSV, HEADER, ENCODING 'UTF8')", spool)
+    cur.close()
+
+
+def _stream_excel(conn, query, params, spool, sheet):
+    """Curseur nommé (côté serveur) lu par blocs vers un classeur en écriture seule"""
+    cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+    cur.itersize = EXPORT_CHUNK_ROWS
+    cur.execute(query, params)
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet)
+
+    rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+    worksheet.append([col[0] for col in cur.description])
+    while rows:
+        for row in rows:
+            worksheet.append(list(row))
+        rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+
+    cur.close()
+    workbook.save(spool)
+
+
+@timed_query
+def export_query(query, params=None, fmt='csv', sheet='Export'):
+    """Exporte le résultat d'une requête en CSV ou Excel
+
+    Renvoie un fichier temporaire positionné au début (à passer tel quel à
+    st.download_button), ou b"" en cas d'erreur.
+    """
+    if fmt == 'xlsx' and Workbook is None:
+        print("❌ Export Excel indisponible : openpyxl n'est pas installé")
+        return b""
+
+    conn = get_connection()
+    if not conn:
+        return b""
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode='w+b')
+    try:
+        if fmt == 'xlsx':
+            _stream_excel(conn, query, params, spool, sheet)
+        else:
+            _copy_csv(conn, query, params, spool)
+        conn.rollback()   # lecture seule : termine la transaction du curseur
+        release_connection(conn)
+    except Exception as e:
+        print(f"❌ Erreur export {fmt} : {e}")
+        conn.rollback()
+        release_connection(conn)
+        spool.close()
+        return b""
+
+    spool.seek(0)
+    return spool
+
+
+# ==========================================
+# EXPORTS DE L'APPLICATION
+# ==========================================
+
+def export_students(fmt='csv', departements=None, niveaux=None, recherche=None):
+    """Liste des étudiants (mêmes filtres que la page Étudiants, sans pagination)"""
+    query, params = students_query(departements, niveaux, recherche, with_id=False)
+    return export_query(query, params, fmt, sheet='Etudiants')
+
+
+def export_exam_schedule(fmt='csv'):
+    """Planning complet des examens"""
+    return export_query(EXAM_SCHEDULE_QUERY, None, fmt, sheet='Planning')
+
+
+def export_professor_surveillances(id_prof, fmt='csv'):
+    """Surveillances d'un professeur"""
+    return export_query(PROFESSOR_SURVEILLANCES_QUERY, (id_prof,), fmt, sheet='Surveillances')
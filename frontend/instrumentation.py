@@ -0,0 +1,196 @@
+# frontend/instrumentation.py
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from psycopg2 import extensions
+
+logger = logging.getLogger("gestion_examens.sql")
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 500))   # seuil du journal des requêtes lentes
+HISTORY_SIZE = 500                                        # mesures conservées par fonction
+SLOW_LOG_SIZE = 50                                        # requêtes lentes conservées
+BYTES_SAMPLE_ROWS = 100                                   # lignes mesurées pour estimer le volume
+
+# Appel en cours : {'name', 'rows', 'bytes'} - alimenté par InstrumentedCursor
+_current_call = contextvars.ContextVar("current_query_call", default=None)
+
+# Requêtes enregistrées par capture_queries() : [(SQL, paramètres)]
+_captured = contextvars.ContextVar("captured_queries", default=None)
+
+_lock = threading.Lock()
+_history = {}                        # nom -> deque[(durée ms, lignes, octets)]
+_errors = {}                         # nom -> nombre d'erreurs SQL
+_slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+
+# ==========================================
+# CURSEUR INSTRUMENTÉ
+# ==========================================
+
+def _estimate_bytes(rows):
+    """Volume approximatif des lignes (mesuré sur un échantillon puis extrapolé)"""
+    if not rows:
+        return 0
+    sample = rows[:BYTES_SAMPLE_ROWS]
+    size = sum(sys.getsizeof(v) for row in sample for v in row)
+    return size * len(rows) // len(sample)
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Curseur psycopg2 qui mesure chaque requête (durée, lignes, octets)
+
+    Installé comme cursor_factory sur toutes les connexions du pool : les
+    helpers existants et pd.read_sql sont mesurés sans modification.
+    """
+
+    def execute(self, query, vars=None):
+        call = _current_call.get()
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((query, vars))
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception as e:
+            name = call['name'] if call else '?'
+            logger.error("Erreur SQL dans %s : %s", name, e)
+            with _lock:
+                _errors[name] = _errors.get(name, 0) + 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if elapsed_ms > SLOW_QUERY_MS:
+                self._log_slow_query(call, query, vars, elapsed_ms)
+
+    def _count(self, rows):
+        call = _current_call.get()
+        if call is not None:
+            call['rows'] += len(rows)
+            call['bytes'] += _estimate_bytes(rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=None):
+        return self._count(super().fetchmany(size) if size is not None else super().fetchmany())
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+    def _log_slow_query(self, call, query, vars, elapsed_ms):
+        """Journalise une requête lente avec son plan d'exécution (EXPLAIN)"""
+        sql = query.decode() if isinstance(query, bytes) else str(query)
+        plan = None
+
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH')) and self.connection.status == extensions.STATUS_IN_TRANSACTION:
+            try:
+                cur = self.connection.cursor(cursor_factory=extensions.cursor)
+                cur.execute("EXPLAIN " + sql, vars)
+                plan = "\n".join(r[0] for r in cur.fetchall())
+                cur.close()
+            except Exception as e:
+                plan = f"(EXPLAIN impossible : {e})"
+
+        entry = {
+            'name': call['name'] if call else '?',
+            'duree_ms': round(elapsed_ms, 1),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'requete': " ".join(sql.split()),
+            'plan': plan
+        }
+        with _lock:
+            _slow_queries.append(entry)
+        logger.warning("Requête lente %s : %.0f ms\n%s\n%s", entry['name'], elapsed_ms,
+                       entry['requete'], plan or "")
+
+
+# ==========================================
+# DÉCORATEUR DES FONCTIONS D'ACCÈS AUX DONNÉES
+# ==========================================
+
+def timed_query(func):
+    """Mesure un helper d'accès aux données : durée totale, lignes et octets lus"""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        call = {'name': name, 'rows': 0, 'bytes': 0}
+        token = _current_call.set(call)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            _current_call.reset(token)
+            with _lock:
+                _history.setdefault(name, deque(maxlen=HISTORY_SIZE)).append(
+                    (elapsed_ms, call['rows'], call['bytes'])
+                )
+
+    return wrapper
+
+
+@contextmanager
+def capture_queries():
+    """Enregistre les requêtes exécutées dans le bloc (pour les analyser avec EXPLAIN)"""
+    queries = []
+    token = _captured.set(queries)
+    try:
+        yield queries
+    finally:
+        _captured.reset(token)
+
+
+# ==========================================
+# STATISTIQUES (page ⏱️ Performance)
+# ==========================================
+
+def _percentile(sorted_values, pct):
+    return sorted_values[int(round(pct * (len(sorted_values) - 1)))]
+
+
+def get_query_stats():
+    """Statistiques par helper : appels, p50/p95/max (ms), lignes et octets moyens, erreurs"""
+    with _lock:
+        history = {name: list(values) for name, values in _history.items()}
+        errors = dict(_errors)
+
+    stats = []
+    for name, values in history.items():
+        durations = sorted(v[0] for v in values)
+        stats.append({
+            'fonction': name,
+            'appels': len(values),
+            'p50_ms': round(_percentile(durations, 0.50), 1),
+            'p95_ms': round(_percentile(durations, 0.95), 1),
+            'max_ms': round(durations[-1], 1),
+            'lignes_moy': round(sum(v[1] for v in values) / len(values), 1),
+            'octets_moy': int(sum(v[2] for v in values) / len(values)),
+            'erreurs': errors.get(name, 0)
+        })
+
+    return sorted(stats, key=lambda s: s['p95_ms'], reverse=True)
+
+
+def get_slow_queries():
+    """Dernières requêtes lentes (plus récente en premier)"""
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+def reset_query_stats():
+    with _lock:
+        _history.clear()
+        _errors.clear()
+        _slow_queries.clear()
@@ -0,0 +1,862 @@
+# frontend/migrations.py
+from db_utils import get_connection, release_connection
+
+# Identifiant du verrou consultatif pris pendant les migrations
+# (évite que deux serveurs Streamlit migrent en même temps)
+MIGRATION_LOCK_ID = 424242
+
+
+# ==========================================
+# MIGRATIONS DU SCHÉMA (versionnées)
+# ==========================================
+# (version, description, SQL) - chaque version n'est appliquée qu'une fois,
+# les versions appliquées sont enregistrées dans SCHEMA_MIGRATIONS.
+MIGRATIONS = [
+    (0, "Schéma de base", """
+    -- Sans effet sur une base existante : crée seulement les tables absentes
+    CREATE TABLE IF NOT EXISTS DEPARTEMENT (
+        id_dept SERIAL PRIMARY KEY,
+        nom VARCHAR(100) NOT NULL,
+        code VARCHAR(10)
+    );
+
+    CREATE TABLE IF NOT EXISTS FORMATION (
+        id_form SERIAL PRIMARY KEY,
+        nom VARCHAR(100) NOT NULL,
+        niveau VARCHAR(5),
+        id_dept INTEGER REFERENCES DEPARTEMENT (id_dept)
+    );
+
+    CREATE TABLE IF NOT EXISTS ETUDIANT (
+        id_etu SERIAL PRIMARY KEY,
+        nom VARCHAR(50) NOT NULL,
+        prenom VARCHAR(50) NOT NULL,
+        email VARCHAR(100),
+        promo VARCHAR(10),
+        id_form INTEGER REFERENCES FORMATION (id_form)
+    );
+
+    CREATE TABLE IF NOT EXISTS MODULE (
+        id_mod SERIAL PRIMARY KEY,
+        nom VARCHAR(100) NOT NULL,
+        credits INTEGER,
+        coefficient NUMERIC(3, 1),
+        id_form INTEGER REFERENCES FORMATION (id_form)
+    );
+
+    CREATE TABLE IF NOT EXISTS PROFESSEUR (
+        id_prof SERIAL PRIMARY KEY,
+        nom VARCHAR(50) NOT NULL,
+        prenom VARCHAR(50) NOT NULL,
+        email VARCHAR(100),
+        specialite VARCHAR(100),
+        id_dept INTEGER REFERENCES DEPARTEMENT (id_dept)
+    );
+
+    CREATE TABLE IF NOT EXISTS LIEU_EXAMEN (
+        id_lieu SERIAL PRIMARY KEY,
+        nom VARCHAR(50) NOT NULL,
+        capacite INTEGER NOT NULL,
+        type_lieu VARCHAR(20),
+        batiment VARCHAR(50),
+        equipements TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS EXAMEN (
+        id_exam SERIAL PRIMARY KEY,
+        date_exam TIMESTAMP NOT NULL,
+        duree_min INTEGER NOT NULL,
+        type_examen VARCHAR(20),
+        session_examen VARCHAR(20),
+        id_mod INTEGER REFERENCES MODULE (id_mod),
+        id_lieu INTEGER REFERENCES LIEU_EXAMEN (id_lieu)
+    );
+
+    CREATE TABLE IF NOT EXISTS INSCRIPTION (
+        id_etu INTEGER REFERENCES ETUDIANT (id_etu),
+        id_mod INTEGER REFERENCES MODULE (id_mod),
+        note NUMERIC(4, 2),
+        statut VARCHAR(20),
+        PRIMARY KEY (id_etu, id_mod)
+    );
+
+    CREATE TABLE IF NOT EXISTS SURVEILLANCE (
+        id_prof INTEGER REFERENCES PROFESSEUR (id_prof),
+        id_exam INTEGER REFERENCES EXAMEN (id_exam),
+        role VARCHAR(20),
+        PRIMARY KEY (id_prof, id_exam)
+    );
+
+    -- Même définition que users_db.init_users_table (qui insère les comptes par défaut)
+    CREATE TABLE IF NOT EXISTS UTILISATEURS (
+        id_user SERIAL PRIMARY KEY,
+        username VARCHAR(50) UNIQUE NOT NULL,
+        password_hash VARCHAR(64) NOT NULL,
+        role VARCHAR(20) NOT NULL CHECK (role IN ('admin', 'professeur', 'etudiant')),
+        email VARCHAR(100),
+        nom VARCHAR(50),
+        prenom VARCHAR(50),
+        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        dernier_login TIMESTAMP
+    );
+    """),
+
+    (1, "Créneau horaire des examens + exclusion des salles", """
+    CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+    -- Intervalle [début, fin) de l'examen, maintenu par PostgreSQL
+    ALTER TABLE EXAMEN
+        ADD COLUMN IF NOT EXISTS creneau TSRANGE
+        GENERATED ALWAYS AS (
+            tsrange(date_exam, date_exam + make_interval(mins => duree_min), '[)')
+        ) STORED;
+
+    -- Une salle ne peut pas accueillir deux examens qui se chevauchent.
+    -- Base existante qui en contient déjà : pas de contrainte ici (l'ALTER
+    -- échouerait et bloquerait le démarrage) ; ensure_room_exclusion()
+    -- signale les conflits et l'ajoute au démarrage une fois corrigés.
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM EXAMEN a
+            JOIN EXAMEN b ON a.id_lieu = b.id_lieu AND a.id_exam < b.id_exam
+                AND a.creneau && b.creneau
+        ) THEN
+            ALTER TABLE EXAMEN
+                ADD CONSTRAINT examen_salle_sans_chevauchement
+                EXCLUDE USING gist (id_lieu WITH =, creneau WITH &&);
+        END IF;
+    END $$;
+    """),
+
+    (2, "Nombre d'inscrits par module maintenu par trigger", """
+    ALTER TABLE MODULE
+        ADD COLUMN IF NOT EXISTS nb_inscrits INTEGER NOT NULL DEFAULT 0;
+
+    UPDATE MODULE m
+    SET nb_inscrits = sub.nb
+    FROM (
+        SELECT id_mod, COUNT(DISTINCT id_etu) AS nb
+        FROM INSCRIPTION
+        GROUP BY id_mod
+    ) sub
+    WHERE m.id_mod = sub.id_mod;
+
+    -- Une inscription = une ligne (id_etu, id_mod) : chaque instruction ajoute
+    -- ou retire son nombre de lignes par module (sûr en écritures concurrentes)
+    CREATE OR REPLACE FUNCTION maj_nb_inscrits() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            UPDATE MODULE SET nb_inscrits = 0 WHERE nb_inscrits <> 0;
+        ELSIF TG_OP = 'INSERT' THEN
+            UPDATE MODULE m SET nb_inscrits = m.nb_inscrits + d.nb
+            FROM (SELECT id_mod, COUNT(*) AS nb FROM nouvelles GROUP BY id_mod) d
+            WHERE m.id_mod = d.id_mod;
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE MODULE m SET nb_inscrits = m.nb_inscrits - d.nb
+            FROM (SELECT id_mod, COUNT(*) AS nb FROM anciennes GROUP BY id_mod) d
+            WHERE m.id_mod = d.id_mod;
+        ELSE
+            UPDATE MODULE m SET nb_inscrits = m.nb_inscrits + d.nb
+            FROM (
+                SELECT id_mod, SUM(nb) AS nb
+                FROM (SELECT id_mod, 1 AS nb FROM nouvelles
+                      UNION ALL
+                      SELECT id_mod, -1 FROM anciennes) t
+                GROUP BY id_mod
+                HAVING SUM(nb) <> 0
+            ) d
+            WHERE m.id_mod = d.id_mod;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER inscription_nb_inscrits_insert AFTER INSERT ON INSCRIPTION
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_nb_inscrits();
+
+    CREATE TRIGGER inscription_nb_inscrits_delete AFTER DELETE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_nb_inscrits();
+
+    CREATE TRIGGER inscription_nb_inscrits_update AFTER UPDATE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_nb_inscrits();
+
+    CREATE TRIGGER inscription_nb_inscrits_truncate AFTER TRUNCATE ON INSCRIPTION
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_nb_inscrits();
+    """),
+
+    (3, "Index des surveillances par examen", """
+    -- La clé primaire (id_prof, id_exam) ne sert pas la recherche par examen
+    -- (surveillants lus par examen dans le planning et les portails)
+    CREATE INDEX IF NOT EXISTS idx_surveillance_exam ON SURVEILLANCE (id_exam);
+    """),
+
+    (4, "Index des chemins de requêtes fréquents", """
+    -- Jointures sur les clés étrangères (la clé primaire (id_etu, id_mod)
+    -- n'existe pas forcément sur les bases importées)
+    CREATE INDEX IF NOT EXISTS idx_inscription_mod ON INSCRIPTION (id_mod);
+    CREATE INDEX IF NOT EXISTS idx_inscription_etu ON INSCRIPTION (id_etu);
+    CREATE INDEX IF NOT EXISTS idx_examen_mod ON EXAMEN (id_mod);
+    CREATE INDEX IF NOT EXISTS idx_surveillance_prof ON SURVEILLANCE (id_prof);
+    CREATE INDEX IF NOT EXISTS idx_etudiant_form ON ETUDIANT (id_form);
+    CREATE INDEX IF NOT EXISTS idx_module_form ON MODULE (id_form);
+
+    -- Occupation d'une salle par date
+    CREATE INDEX IF NOT EXISTS idx_examen_lieu_date ON EXAMEN (id_lieu, date_exam);
+
+    -- Comptes reliés aux étudiants / professeurs par LOWER(email)
+    CREATE INDEX IF NOT EXISTS idx_utilisateurs_email ON UTILISATEURS (LOWER(email));
+    CREATE INDEX IF NOT EXISTS idx_etudiant_email ON ETUDIANT (LOWER(email));
+    CREATE INDEX IF NOT EXISTS idx_professeur_email ON PROFESSEUR (LOWER(email));
+    """),
+
+    (5, "Index de pagination de la liste des étudiants", """
+    -- Pagination par clé (nom, id_etu) de la page Étudiants
+    CREATE INDEX IF NOT EXISTS idx_etudiant_nom ON ETUDIANT (nom, id_etu);
+    """),
+
+    (6, "Violations de contraintes maintenues par trigger", """
+    -- Une ligne par violation : (étudiant, jour), (professeur, jour) ou examen
+    -- dont la salle est trop petite. Chaque écriture ne recalcule que ses clés.
+    CREATE TABLE IF NOT EXISTS VIOLATION_CONTRAINTE (
+        type_violation VARCHAR(20) NOT NULL,   -- etudiant_jour, professeur_jour, salle_capacite
+        id_ref INTEGER NOT NULL,               -- id_etu, id_prof ou id_exam
+        jour DATE NOT NULL,
+        nb INTEGER NOT NULL,                   -- examens du jour, ou inscrits
+        PRIMARY KEY (type_violation, id_ref, jour)
+    );
+
+    CREATE OR REPLACE FUNCTION violations_etudiants(ids INTEGER[], jours DATE[]) RETURNS VOID AS $$
+    BEGIN
+        DELETE FROM VIOLATION_CONTRAINTE v
+        USING unnest(ids, jours) k(id_etu, jour)
+        WHERE v.type_violation = 'etudiant_jour' AND v.id_ref = k.id_etu AND v.jour = k.jour;
+
+        INSERT INTO VIOLATION_CONTRAINTE (type_violation, id_ref, jour, nb)
+        SELECT 'etudiant_jour', k.id_etu, k.jour, COUNT(*)
+        FROM (SELECT DISTINCT id_etu, jour FROM unnest(ids, jours) k(id_etu, jour)) k
+        JOIN INSCRIPTION i ON i.id_etu = k.id_etu
+        JOIN EXAMEN e ON e.id_mod = i.id_mod
+            AND e.date_exam >= k.jour AND e.date_exam < k.jour + 1
+        GROUP BY k.id_etu, k.jour
+        HAVING COUNT(*) > 1
+        ON CONFLICT (type_violation, id_ref, jour) DO UPDATE SET nb = EXCLUDED.nb;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION violations_professeurs(ids INTEGER[], jours DATE[]) RETURNS VOID AS $$
+    BEGIN
+        DELETE FROM VIOLATION_CONTRAINTE v
+        USING unnest(ids, jours) k(id_prof, jour)
+        WHERE v.type_violation = 'professeur_jour' AND v.id_ref = k.id_prof AND v.jour = k.jour;
+
+        INSERT INTO VIOLATION_CONTRAINTE (type_violation, id_ref, jour, nb)
+        SELECT 'professeur_jour', k.id_prof, k.jour, COUNT(*)
+        FROM (SELECT DISTINCT id_prof, jour FROM unnest(ids, jours) k(id_prof, jour)) k
+        JOIN SURVEILLANCE s ON s.id_prof = k.id_prof
+        JOIN EXAMEN e ON e.id_exam = s.id_exam
+            AND e.date_exam >= k.jour AND e.date_exam < k.jour + 1
+        GROUP BY k.id_prof, k.jour
+        HAVING COUNT(*) > 3
+        ON CONFLICT (type_violation, id_ref, jour) DO UPDATE SET nb = EXCLUDED.nb;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION violations_salles(ids INTEGER[]) RETURNS VOID AS $$
+    BEGIN
+        DELETE FROM VIOLATION_CONTRAINTE
+        WHERE type_violation = 'salle_capacite' AND id_ref = ANY(ids);
+
+        INSERT INTO VIOLATION_CONTRAINTE (type_violation, id_ref, jour, nb)
+        SELECT 'salle_capacite', e.id_exam, e.date_exam::date, m.nb_inscrits
+        FROM EXAMEN e
+        JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+        JOIN MODULE m ON e.id_mod = m.id_mod
+        WHERE e.id_exam = ANY(ids) AND m.nb_inscrits > l.capacite
+        ON CONFLICT (type_violation, id_ref, jour) DO UPDATE SET nb = EXCLUDED.nb;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Examen ajouté, déplacé ou supprimé : ses inscrits et surveillants,
+    -- l'ancien et le nouveau jour, et sa salle
+    CREATE OR REPLACE FUNCTION maj_violations_examen() RETURNS TRIGGER AS $$
+    DECLARE
+        examens INTEGER[]; modules INTEGER[]; jours DATE[];
+        ids INTEGER[]; ids_jours DATE[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(id_exam), array_agg(id_mod), array_agg(date_exam::date)
+            INTO examens, modules, jours FROM nouvelles;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(id_exam), array_agg(id_mod), array_agg(date_exam::date)
+            INTO examens, modules, jours FROM anciennes;
+        ELSE
+            SELECT array_agg(id_exam), array_agg(id_mod), array_agg(date_exam::date)
+            INTO examens, modules, jours
+            FROM (SELECT id_exam, id_mod, date_exam FROM nouvelles
+                  UNION
+                  SELECT id_exam, id_mod, date_exam FROM anciennes) t;
+        END IF;
+
+        SELECT array_agg(i.id_etu), array_agg(x.jour) INTO ids, ids_jours
+        FROM unnest(modules, jours) x(id_mod, jour)
+        JOIN INSCRIPTION i ON i.id_mod = x.id_mod;
+        PERFORM violations_etudiants(ids, ids_jours);
+
+        SELECT array_agg(s.id_prof), array_agg(x.jour) INTO ids, ids_jours
+        FROM unnest(examens, jours) x(id_exam, jour)
+        JOIN SURVEILLANCE s ON s.id_exam = x.id_exam;
+        PERFORM violations_professeurs(ids, ids_jours);
+
+        PERFORM violations_salles(examens);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION maj_violations_surveillance() RETURNS TRIGGER AS $$
+    DECLARE
+        ids INTEGER[]; jours DATE[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(x.id_prof), array_agg(e.date_exam::date) INTO ids, jours
+            FROM nouvelles x JOIN EXAMEN e ON e.id_exam = x.id_exam;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(x.id_prof), array_agg(e.date_exam::date) INTO ids, jours
+            FROM anciennes x JOIN EXAMEN e ON e.id_exam = x.id_exam;
+        ELSE
+            SELECT array_agg(x.id_prof), array_agg(e.date_exam::date) INTO ids, jours
+            FROM (SELECT id_prof, id_exam FROM nouvelles
+                  UNION
+                  SELECT id_prof, id_exam FROM anciennes) x
+            JOIN EXAMEN e ON e.id_exam = x.id_exam;
+        END IF;
+
+        PERFORM violations_professeurs(ids, jours);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Inscriptions : jours d'examen des étudiants touchés, et examens des
+    -- modules dont nb_inscrits vient de changer (triggers nb_inscrits
+    -- exécutés avant, ordre alphabétique des noms)
+    CREATE OR REPLACE FUNCTION maj_violations_inscription() RETURNS TRIGGER AS $$
+    DECLARE
+        etudiants INTEGER[]; modules INTEGER[];
+        ids INTEGER[]; jours DATE[]; examens INTEGER[];
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM VIOLATION_CONTRAINTE
+            WHERE type_violation IN ('etudiant_jour', 'salle_capacite');
+            RETURN NULL;
+        ELSIF TG_OP = 'INSERT' THEN
+            SELECT array_agg(id_etu), array_agg(id_mod) INTO etudiants, modules FROM nouvelles;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(id_etu), array_agg(id_mod) INTO etudiants, modules FROM anciennes;
+        ELSE
+            SELECT array_agg(id_etu), array_agg(id_mod) INTO etudiants, modules
+            FROM (SELECT id_etu, id_mod FROM nouvelles
+                  UNION
+                  SELECT id_etu, id_mod FROM anciennes) t;
+        END IF;
+
+        SELECT array_agg(x.id_etu), array_agg(e.date_exam::date) INTO ids, jours
+        FROM unnest(etudiants, modules) x(id_etu, id_mod)
+        JOIN EXAMEN e ON e.id_mod = x.id_mod;
+        PERFORM violations_etudiants(ids, jours);
+
+        SELECT array_agg(id_exam) INTO examens FROM EXAMEN WHERE id_mod = ANY(modules);
+        PERFORM violations_salles(examens);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION maj_violations_lieu() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM violations_salles(array_agg(e.id_exam))
+        FROM EXAMEN e
+        WHERE e.id_lieu IN (SELECT id_lieu FROM nouvelles);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER examen_violations_insert AFTER INSERT ON EXAMEN
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_examen();
+
+    CREATE TRIGGER examen_violations_delete AFTER DELETE ON EXAMEN
+        REFERENCING OLD TABLE AS anciennes
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_examen();
+
+    CREATE TRIGGER examen_violations_update AFTER UPDATE ON EXAMEN
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_examen();
+
+    CREATE TRIGGER surveillance_violations_insert AFTER INSERT ON SURVEILLANCE
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_surveillance();
+
+    CREATE TRIGGER surveillance_violations_delete AFTER DELETE ON SURVEILLANCE
+        REFERENCING OLD TABLE AS anciennes
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_surveillance();
+
+    CREATE TRIGGER surveillance_violations_update AFTER UPDATE ON SURVEILLANCE
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_surveillance();
+
+    CREATE TRIGGER inscription_violations_insert AFTER INSERT ON INSCRIPTION
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_inscription();
+
+    CREATE TRIGGER inscription_violations_delete AFTER DELETE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_inscription();
+
+    CREATE TRIGGER inscription_violations_update AFTER UPDATE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_inscription();
+
+    CREATE TRIGGER inscription_violations_truncate AFTER TRUNCATE ON INSCRIPTION
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_inscription();
+
+    CREATE TRIGGER lieu_examen_violations_update AFTER UPDATE ON LIEU_EXAMEN
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_violations_lieu();
+
+    -- État initial
+    SELECT violations_etudiants(array_agg(k.id_etu), array_agg(k.jour))
+    FROM (SELECT DISTINCT i.id_etu, e.date_exam::date AS jour
+          FROM INSCRIPTION i JOIN EXAMEN e ON e.id_mod = i.id_mod) k;
+
+    SELECT violations_professeurs(array_agg(k.id_prof), array_agg(k.jour))
+    FROM (SELECT DISTINCT s.id_prof, e.date_exam::date AS jour
+          FROM SURVEILLANCE s JOIN EXAMEN e ON e.id_exam = s.id_exam) k;
+
+    SELECT violations_salles(array_agg(id_exam)) FROM EXAMEN;
+    """),
+
+    (7, "Lien des comptes vers ETUDIANT / PROFESSEUR", """
+    -- Résolu une fois (ici, puis à la connexion pour les nouveaux comptes) :
+    -- les portails lisent par identifiant au lieu de joindre sur LOWER(email)
+    ALTER TABLE UTILISATEURS
+        ADD COLUMN IF NOT EXISTS id_etu INTEGER REFERENCES ETUDIANT (id_etu) ON DELETE SET NULL,
+        ADD COLUMN IF NOT EXISTS id_prof INTEGER REFERENCES PROFESSEUR (id_prof) ON DELETE SET NULL;
+
+    UPDATE UTILISATEURS u
+    SET id_etu = e.id_etu
+    FROM ETUDIANT e
+    WHERE u.role = 'etudiant' AND u.id_etu IS NULL AND LOWER(e.email) = LOWER(u.email);
+
+    UPDATE UTILISATEURS u
+    SET id_prof = p.id_prof
+    FROM PROFESSEUR p
+    WHERE u.role = 'professeur' AND u.id_prof IS NULL AND LOWER(p.email) = LOWER(u.email);
+    """),
+
+    (8, "Planning précalculé par étudiant", """
+    -- Une ligne par (étudiant, examen), prête à afficher : le portail étudiant
+    -- lit une plage de la clé primaire au lieu de joindre 5 tables.
+    -- Reconstruit par lots à la publication (sauvegarde du planning, CRUD des
+    -- examens et surveillances) ; les inscriptions sont suivies par trigger.
+    CREATE TABLE IF NOT EXISTS PLANNING_ETUDIANT (
+        id_etu INTEGER NOT NULL,
+        date_exam TIMESTAMP NOT NULL,
+        id_exam INTEGER NOT NULL,
+        duree_min INTEGER,
+        type_examen VARCHAR(20),
+        session_examen VARCHAR(20),
+        id_mod INTEGER NOT NULL,
+        module VARCHAR(100),
+        credits INTEGER,
+        coefficient NUMERIC(3, 1),
+        salle VARCHAR(50),
+        batiment VARCHAR(50),
+        capacite INTEGER,
+        statut VARCHAR(20),
+        note NUMERIC(4, 2),
+        surveillants TEXT,
+        PRIMARY KEY (id_etu, date_exam, id_exam)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_planning_etudiant_exam ON PLANNING_ETUDIANT (id_exam);
+    CREATE INDEX IF NOT EXISTS idx_planning_etudiant_inscription ON PLANNING_ETUDIANT (id_etu, id_mod);
+
+    -- Version du planning publié (une seule ligne) : incrémentée à chaque
+    -- reconstruction, sert de validateur de cache aux lecteurs
+    CREATE TABLE IF NOT EXISTS PLANNING_VERSION (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        version BIGINT NOT NULL DEFAULT 0,
+        date_maj TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    INSERT INTO PLANNING_VERSION (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+    CREATE OR REPLACE FUNCTION planning_etudiant_lignes(ids_exam INTEGER[], ids_etu INTEGER[], ids_mod INTEGER[])
+    RETURNS VOID AS $$
+    BEGIN
+        -- ids_exam : examens à reconstruire ; ids_etu / ids_mod : inscriptions.
+        -- Tous NULL : reconstruction complète.
+        INSERT INTO PLANNING_ETUDIANT
+        SELECT i.id_etu, e.date_exam, e.id_exam, e.duree_min, e.type_examen, e.session_examen,
+               m.id_mod, m.nom, m.credits, m.coefficient, l.nom, l.batiment, l.capacite,
+               i.statut, i.note, sv.surveillants
+        FROM EXAMEN e
+        JOIN MODULE m ON e.id_mod = m.id_mod
+        JOIN INSCRIPTION i ON i.id_mod = m.id_mod
+        JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+        LEFT JOIN LATERAL (
+            SELECT STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants
+            FROM SURVEILLANCE s
+            JOIN PROFESSEUR p ON s.id_prof = p.id_prof
+            WHERE s.id_exam = e.id_exam
+        ) sv ON TRUE
+        WHERE (ids_exam IS NULL OR e.id_exam = ANY(ids_exam))
+          AND (ids_etu IS NULL OR (i.id_etu, i.id_mod) IN (
+                SELECT * FROM unnest(ids_etu, ids_mod)));
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION rafraichir_planning_etudiants(ids_exam INTEGER[]) RETURNS VOID AS $$
+    BEGIN
+        -- ids_exam NULL : tout le planning
+        IF ids_exam IS NULL THEN
+            TRUNCATE PLANNING_ETUDIANT;
+        ELSE
+            DELETE FROM PLANNING_ETUDIANT WHERE id_exam = ANY(ids_exam);
+        END IF;
+
+        PERFORM planning_etudiant_lignes(ids_exam, NULL, NULL);
+
+        UPDATE PLANNING_VERSION SET version = version + 1, date_maj = CURRENT_TIMESTAMP;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION maj_planning_inscription() RETURNS TRIGGER AS $$
+    DECLARE
+        etus INTEGER[];
+        mods INTEGER[];
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE PLANNING_ETUDIANT;
+        ELSE
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM PLANNING_ETUDIANT p
+                USING anciennes a
+                WHERE p.id_etu = a.id_etu AND p.id_mod = a.id_mod;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(id_etu), array_agg(id_mod) INTO etus, mods FROM nouvelles;
+                IF etus IS NOT NULL THEN
+                    PERFORM planning_etudiant_lignes(NULL, etus, mods);
+                END IF;
+            END IF;
+        END IF;
+
+        UPDATE PLANNING_VERSION SET version = version + 1, date_maj = CURRENT_TIMESTAMP;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER inscription_planning_insert AFTER INSERT ON INSCRIPTION
+        REFERENCING NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_inscription();
+
+    CREATE TRIGGER inscription_planning_delete AFTER DELETE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_inscription();
+
+    CREATE TRIGGER inscription_planning_update AFTER UPDATE ON INSCRIPTION
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_inscription();
+
+    CREATE TRIGGER inscription_planning_truncate AFTER TRUNCATE ON INSCRIPTION
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_inscription();
+
+    -- État initial
+    SELECT rafraichir_planning_etudiants(NULL);
+    """),
+
+    (9, "Notification des publications du planning", """
+    -- Chaque publication (mise à jour de PLANNING_VERSION) est annoncée sur
+    -- le canal d'invalidation de cache.py : les répliques (API comprise)
+    -- incrémentent la table PLANNING_VERSION sans la relire à chaque requête.
+    -- Un seul message par transaction (PostgreSQL fusionne les doublons).
+    CREATE OR REPLACE FUNCTION notifier_planning() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM pg_notify('gestion_examens_invalidation', json_build_object(
+            'tables', json_build_array('PLANNING_VERSION'),
+            'key', NULL,
+            'origin', 'postgres')::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER planning_version_notification AFTER UPDATE ON PLANNING_VERSION
+        FOR EACH STATEMENT EXECUTE FUNCTION notifier_planning();
+    """),
+
+    (10, "Publication du planning au commit + noms et salles à jour", """
+    -- Incrémenter PLANNING_VERSION au milieu de la transaction gardait le
+    -- verrou de son unique ligne jusqu'au commit : sauvegardes de planning et
+    -- inscriptions concurrentes attendaient les unes après les autres.
+    -- Les écritures ne font plus qu'ajouter un marqueur par transaction (clé
+    -- propre, sans attente) ; un trigger différé incrémente la version au
+    -- commit, le verrou n'est plus tenu que le temps du commit.
+    CREATE UNLOGGED TABLE IF NOT EXISTS PLANNING_A_PUBLIER (
+        xact XID8 PRIMARY KEY DEFAULT pg_current_xact_id()
+    );
+
+    CREATE OR REPLACE FUNCTION planning_modifie() RETURNS VOID AS $$
+        INSERT INTO PLANNING_A_PUBLIER DEFAULT VALUES ON CONFLICT DO NOTHING;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION publier_planning() RETURNS TRIGGER AS $$
+    BEGIN
+        DELETE FROM PLANNING_A_PUBLIER WHERE xact = NEW.xact;
+        -- Heure du commit (pas du début de transaction) : Last-Modified croissant
+        UPDATE PLANNING_VERSION
+        SET version = version + 1, date_maj = GREATEST(date_maj, clock_timestamp());
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE CONSTRAINT TRIGGER planning_publication AFTER INSERT ON PLANNING_A_PUBLIER
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION publier_planning();
+
+    CREATE OR REPLACE FUNCTION rafraichir_planning_etudiants(ids_exam INTEGER[]) RETURNS VOID AS $$
+    BEGIN
+        -- ids_exam NULL : tout le planning
+        IF ids_exam IS NULL THEN
+            TRUNCATE PLANNING_ETUDIANT;
+        ELSE
+            DELETE FROM PLANNING_ETUDIANT WHERE id_exam = ANY(ids_exam);
+        END IF;
+
+        PERFORM planning_etudiant_lignes(ids_exam, NULL, NULL);
+        PERFORM planning_modifie();
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION maj_planning_inscription() RETURNS TRIGGER AS $$
+    DECLARE
+        etus INTEGER[];
+        mods INTEGER[];
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE PLANNING_ETUDIANT;
+        ELSE
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM PLANNING_ETUDIANT p
+                USING anciennes a
+                WHERE p.id_etu = a.id_etu AND p.id_mod = a.id_mod;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT array_agg(id_etu), array_agg(id_mod) INTO etus, mods FROM nouvelles;
+                IF etus IS NOT NULL THEN
+                    PERFORM planning_etudiant_lignes(NULL, etus, mods);
+                END IF;
+            END IF;
+        END IF;
+
+        PERFORM planning_modifie();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    -- Colonnes recopiées dans PLANNING_ETUDIANT : module renommé, salle
+    -- modifiée ou surveillant renommé, seuls ses examens sont reconstruits.
+    -- (nb_inscrits, mis à jour à chaque inscription, ne déclenche rien)
+    CREATE OR REPLACE FUNCTION maj_planning_referentiel() RETURNS TRIGGER AS $$
+    DECLARE
+        examens INTEGER[];
+    BEGIN
+        IF TG_TABLE_NAME = 'module' THEN
+            SELECT array_agg(e.id_exam) INTO examens
+            FROM nouvelles n
+            JOIN anciennes a ON a.id_mod = n.id_mod
+            JOIN EXAMEN e ON e.id_mod = n.id_mod
+            WHERE (n.nom, n.credits, n.coefficient) IS DISTINCT FROM (a.nom, a.credits, a.coefficient);
+        ELSIF TG_TABLE_NAME = 'lieu_examen' THEN
+            SELECT array_agg(e.id_exam) INTO examens
+            FROM nouvelles n
+            JOIN anciennes a ON a.id_lieu = n.id_lieu
+            JOIN EXAMEN e ON e.id_lieu = n.id_lieu
+            WHERE (n.nom, n.batiment, n.capacite) IS DISTINCT FROM (a.nom, a.batiment, a.capacite);
+        ELSE
+            SELECT array_agg(DISTINCT s.id_exam) INTO examens
+            FROM nouvelles n
+            JOIN anciennes a ON a.id_prof = n.id_prof
+            JOIN SURVEILLANCE s ON s.id_prof = n.id_prof
+            WHERE (n.nom, n.prenom) IS DISTINCT FROM (a.nom, a.prenom);
+        END IF;
+
+        IF examens IS NOT NULL THEN
+            PERFORM rafraichir_planning_etudiants(examens);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER module_planning_update AFTER UPDATE ON MODULE
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_referentiel();
+
+    CREATE TRIGGER lieu_examen_planning_update AFTER UPDATE ON LIEU_EXAMEN
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_referentiel();
+
+    CREATE TRIGGER professeur_planning_update AFTER UPDATE ON PROFESSEUR
+        REFERENCING OLD TABLE AS anciennes NEW TABLE AS nouvelles
+        FOR EACH STATEMENT EXECUTE FUNCTION maj_planning_referentiel();
+    """),
+]
+
+
+# ==========================================
+# EXCLUSION DES SALLES (migration 1)
+# ==========================================
+ROOM_CONFLICTS_QUERY = """
+SELECT a.id_lieu, a.id_exam, a.date_exam, b.id_exam, b.date_exam
+FROM EXAMEN a
+JOIN EXAMEN b ON a.id_lieu = b.id_lieu AND a.id_exam < b.id_exam
+    AND a.creneau && b.creneau
+ORDER BY a.id_lieu, a.date_exam;
+"""
+
+
+ROOM_EXCLUSION_QUERY = """
+SELECT 1 FROM pg_constraint
+WHERE conname = 'examen_salle_sans_chevauchement'
+  AND conrelid = 'examen'::regclass;
+"""
+
+# Examens écrits (ids_exam) qui chevauchent un autre examen de leur salle
+NEW_ROOM_CONFLICTS_QUERY = """
+SELECT e.id_lieu, e.id_exam, e.date_exam, b.id_exam, b.date_exam
+FROM EXAMEN e
+JOIN EXAMEN b ON b.id_lieu = e.id_lieu AND b.id_exam <> e.id_exam
+    AND b.creneau && e.creneau
+WHERE e.id_exam = ANY(%s)
+ORDER BY e.id_lieu, e.date_exam;
+"""
+
+
+def guard_room_overlaps(cur):
+    """À appeler avant d'écrire dans EXAMEN ; True si room_conflicts() est nécessaire
+
+    Sans la contrainte d'exclusion (chevauchements anciens non corrigés, voir
+    ensure_room_exclusion), les écritures sur EXAMEN sont sérialisées jusqu'au
+    commit : la vérification faite après l'écriture ne peut pas être
+    contournée par une sauvegarde concurrente.
+    """
+    cur.execute(ROOM_EXCLUSION_QUERY)
+    if cur.fetchone():
+        return False
+    cur.execute("LOCK TABLE EXAMEN IN SHARE ROW EXCLUSIVE MODE;")
+    return True
+
+
+def room_conflicts(cur, ids_exam):
+    """(id_lieu, id_exam, date, autre id_exam, autre date) des examens écrits en conflit"""
+    cur.execute(NEW_ROOM_CONFLICTS_QUERY, (list(ids_exam),))
+    return cur.fetchall()
+
+
+def ensure_room_exclusion(cur):
+    """Ajoute examen_salle_sans_chevauchement si elle manque et que c'est possible
+
+    Tant que des examens existants se chevauchent dans une salle, la
+    contrainte ne peut pas être créée : les paires en conflit sont affichées
+    (à déplacer ou supprimer, par exemple depuis la page Gestion des examens)
+    et la contrainte est ajoutée au démarrage suivant. Renvoie True si elle
+    est en place.
+    """
+    cur.execute(ROOM_EXCLUSION_QUERY)
+    if cur.fetchone():
+        return True
+
+    cur.execute(ROOM_CONFLICTS_QUERY)
+    conflicts = cur.fetchall()
+    if conflicts:
+        print(f"⚠️ {len(conflicts)} paires d'examens se chevauchent dans une même salle : "
+              f"contrainte examen_salle_sans_chevauchement non créée")
+        for id_lieu, id_a, date_a, id_b, date_b in conflicts[:20]:
+            print(f"   - salle {id_lieu} : examen {id_a} ({date_a}) / examen {id_b} ({date_b})")
+        if len(conflicts) > 20:
+            print(f"   ... et {len(conflicts) - 20} autres")
+        print("   Corrigez ces examens puis redémarrez : la contrainte sera ajoutée automatiquement")
+        print("   D'ici là, chaque écriture d'examen est vérifiée (et sérialisée) par l'application")
+        return False
+
+    cur.execute("""
+    ALTER TABLE EXAMEN
+        ADD CONSTRAINT examen_salle_sans_chevauchement
+        EXCLUDE USING gist (id_lieu WITH =, creneau WITH &&);
+    """)
+    print("✅ Contrainte examen_salle_sans_chevauchement ajoutée")
+    return True
+
+
+def apply_migrations():
+    """Applique les migrations manquantes (idempotent)"""
+    conn = get_connection()
+    if not conn:
+        print("❌ Impossible de se connecter à PostgreSQL")
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS SCHEMA_MIGRATIONS (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            date_application TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        conn.commit()
+
+        cur.execute("SELECT version FROM SCHEMA_MIGRATIONS;")
+        applied = {row[0] for row in cur.fetchall()}
+
+        for version, description, sql in MIGRATIONS:
+            if version in applied:
+                continue
+
+            print(f"🔨 Migration {version} : {description}...")
+            cur.execute(sql)
+            cur.execute("""
+            INSERT INTO SCHEMA_MIGRATIONS (version, description)
+            VALUES (%s, %s);
+            """, (version, description))
+            conn.commit()
+            print(f"✅ Migration {version} appliquée")
+
+        ensure_room_exclusion(cur)
+        conn.commit()
+
+        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cur.close()
+        release_connection(conn)
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur migration : {e}")
+        if conn:
+            conn.rollback()
+            # Connexion détruite : le verrou consultatif est libéré avec elle
+            release_connection(conn, close=True)
+        return False
+
+
+# Application manuelle des migrations
+if __name__ == "__main__":
+    if apply_migrations():
+        print("\n✅ Schéma à jour")
@@ -0,0 +1,72 @@
+# frontend/occupancy.py
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+
+class OccupancyIndex:
+    """Index en mémoire des salles occupées (intervalles triés par salle)
+
+    Chaque examen occupe sa salle sur l'intervalle [début, début + durée).
+    Pour chaque salle on garde les débuts triés et le maximum cumulé des fins :
+    savoir si un créneau chevauche un examen existant coûte O(log n).
+
+    Sert à proposer des salles libres (get_available_rooms, candidats du
+    solveur), pas à valider une écriture : les conflits sont refusés par
+    PostgreSQL (examen_salle_sans_chevauchement, ou room_conflicts() de
+    migrations.py tant que la contrainte manque).
+    """
+
+    def __init__(self, examens=()):
+        """examens : itérable de tuples (date_exam, id_lieu, duree_min)"""
+        self._intervals = {}   # id_lieu -> [(début, fin)] triés par début
+        self._starts = {}      # id_lieu -> [début]
+        self._max_ends = {}    # id_lieu -> [max des fins jusqu'à i inclus]
+
+        for date_exam, id_lieu, duree_min in examens:
+            self._intervals.setdefault(id_lieu, []).append(
+                (date_exam, date_exam + timedelta(minutes=duree_min))
+            )
+
+        for id_lieu in self._intervals:
+            self._intervals[id_lieu].sort()
+            self._reindex(id_lieu)
+
+    def _reindex(self, id_lieu):
+        intervals = self._intervals[id_lieu]
+        self._starts[id_lieu] = [debut for debut, _ in intervals]
+
+        max_ends = []
+        for _, fin in intervals:
+            max_ends.append(fin if not max_ends or fin > max_ends[-1] else max_ends[-1])
+        self._max_ends[id_lieu] = max_ends
+
+    def is_free(self, id_lieu, date_exam, duree_min):
+        """La salle est-elle libre sur [date_exam, date_exam + duree_min) ?"""
+        starts = self._starts.get(id_lieu)
+        if not starts:
+            return True
+
+        fin = date_exam + timedelta(minutes=duree_min)
+
+        # Examens commençant avant la fin du créneau : il y a chevauchement
+        # si l'un d'eux se termine après le début du créneau
+        n = bisect_left(starts, fin)
+        return n == 0 or self._max_ends[id_lieu][n - 1] <= date_exam
+
+    def free_rooms(self, rooms, date_exam, duree_min, key='id_lieu'):
+        """Filtre une liste de salles (dicts ou tuples) pour ne garder que les libres"""
+        return self.free_rooms_many(rooms, [(date_exam, duree_min)], key)[0]
+
+    def free_rooms_many(self, rooms, slots, key='id_lieu'):
+        """Salles libres pour chaque créneau (date_exam, duree_min), dans l'ordre des créneaux"""
+        ids = [r[key] if isinstance(r, dict) else r[0] for r in rooms]
+        result = []
+        for date_exam, duree_min in slots:
+            if isinstance(date_exam, str):
+                date_exam = datetime.fromisoformat(date_exam)
+            result.append([r for r, id_lieu in zip(rooms, ids)
+                           if self.is_free(id_lieu, date_exam, duree_min)])
+        return result
+
+    def __len__(self):
+        return sum(len(v) for v in self._intervals.values())
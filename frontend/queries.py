@@ -1,12 +1,26 @@
 # frontend/queries.py
 import pandas as pd
-from db_utils import get_connection
+from psycopg2 import errors
+from db_utils import get_connection, release_connection
+from instrumentation import timed_query
+from cache import cached_query, bump_tables, notify_tables, query_failed
+from migrations import guard_room_overlaps, room_conflicts
+from occupancy import OccupancyIndex
+from request_scope import request_memo
+# Entités typées : une seule définition, ré-exportée pour les imports existants
+from repository import (
+    Module, Professor, Room, ExamDetails, Supervisor,
+    get_all_modules, get_all_professors, get_all_rooms,
+    get_exam_details, get_exam_details_many
+)
 
 
 # ==========================================
 # REQUÊTES D'ANALYSE
 # ==========================================
 
+@cached_query('ETUDIANT', 'FORMATION', 'DEPARTEMENT')
+@timed_query
 def load_students_by_department():
     """Liste des étudiants par département"""
     query = """
@@ -26,11 +40,159 @@ def load_students_by_department():
     conn = get_connection()
     if conn:
         df = pd.read_sql(query, conn)
-        conn.close()
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
 
 
+STUDENTS_PAGE_SIZE = 50
+
+
+def _students_filters(departements, niveaux, recherche):
+    """Clause WHERE et paramètres des filtres de la liste des étudiants"""
+    conditions, params = [], {}
+
+    if departements:
+        conditions.append("d.nom = ANY(%(departements)s)")
+        params['departements'] = list(departements)
+    if niveaux:
+        conditions.append("f.niveau = ANY(%(niveaux)s)")
+        params['niveaux'] = list(niveaux)
+    if recherche:
+        # % et _ saisis sont cherchés tels quels (échappés par '!')
+        conditions.append("(e.nom ILIKE %(recherche)s ESCAPE '!' OR e.prenom ILIKE %(recherche)s ESCAPE '!'"
+                          " OR e.email ILIKE %(recherche)s ESCAPE '!')")
+        motif = recherche.strip().replace('!', '!!').replace('%', '!%').replace('_', '!_')
+        params['recherche'] = f"%{motif}%"
+
+    return conditions, params
+
+
+def students_query(departements=None, niveaux=None, recherche=None, after=None, limit=None,
+                   with_id=True):
+    """Requête de la liste des étudiants filtrée : (SQL, paramètres)
+
+    Partagée par la page Étudiants (pagination par clé) et l'export.
+    with_id=False : sans id_etu, colonnes affichées par la page (export).
+    """
+    conditions, params = _students_filters(departements, niveaux, recherche)
+    if after:
+        conditions.append("(e.nom, e.id_etu) > (%(after_nom)s, %(after_id)s)")
+        params['after_nom'], params['after_id'] = after
+    if limit:
+        params['limit'] = limit
+
+    query = f"""
+    SELECT 
+        {"e.id_etu," if with_id else ""}
+        d.nom AS departement,
+        d.code,
+        e.nom,
+        e.prenom,
+        e.email,
+        f.nom AS formation,
+        f.niveau
+    FROM ETUDIANT e
+    JOIN FORMATION f ON e.id_form = f.id_form
+    JOIN DEPARTEMENT d ON f.id_dept = d.id_dept
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+    ORDER BY e.nom, e.id_etu
+    {"LIMIT %(limit)s" if limit else ""};
+    """
+    return query, params
+
+
+@cached_query('ETUDIANT', 'FORMATION', 'DEPARTEMENT')
+@timed_query
+def load_students_page(departements=None, niveaux=None, recherche=None, after=None,
+                       limit=STUDENTS_PAGE_SIZE):
+    """Une page d'étudiants filtrée côté serveur (pagination par clé)
+
+    after : clé (nom, id_etu) de la dernière ligne de la page précédente.
+    Renvoie (DataFrame, clé de la page suivante ou None). limit=None renvoie
+    toutes les lignes filtrées.
+    """
+    # Une ligne de plus : y a-t-il une page suivante ?
+    query, params = students_query(departements, niveaux, recherche, after,
+                                   limit + 1 if limit else None)
+
+    conn = get_connection()
+    if not conn:
+        return query_failed((pd.DataFrame(), None))
+
+    try:
+        df = pd.read_sql(query, conn, params=params)
+        release_connection(conn)
+    except Exception as e:
+        print(f"❌ Erreur chargement étudiants : {e}")
+        release_connection(conn)
+        return query_failed((pd.DataFrame(), None))
+
+    next_key = None
+    if limit and len(df) > limit:
+        df = df.iloc[:limit]
+        next_key = (df['nom'].iloc[-1], int(df['id_etu'].iloc[-1]))
+
+    return df, next_key
+
+
+@cached_query('ETUDIANT', 'FORMATION', 'DEPARTEMENT')
+@timed_query
+def count_students(departements=None, niveaux=None, recherche=None):
+    """Nombre d'étudiants correspondant aux filtres"""
+    conditions, params = _students_filters(departements, niveaux, recherche)
+    conn = get_connection()
+    if not conn:
+        return query_failed(None)
+
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+        SELECT COUNT(*)
+        FROM ETUDIANT e
+        JOIN FORMATION f ON e.id_form = f.id_form
+        JOIN DEPARTEMENT d ON f.id_dept = d.id_dept
+        {"WHERE " + " AND ".join(conditions) if conditions else ""};
+        """, params)
+        count = cur.fetchone()[0]
+        cur.close()
+        release_connection(conn)
+        return count
+
+    except Exception as e:
+        print(f"❌ Erreur comptage étudiants : {e}")
+        release_connection(conn)
+        return query_failed(None)
+
+
+@cached_query('DEPARTEMENT', 'FORMATION')
+@timed_query
+def get_student_filter_options():
+    """Valeurs des filtres de la page Étudiants : départements et niveaux"""
+    conn = get_connection()
+    if not conn:
+        return query_failed({})
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+        SELECT
+            (SELECT ARRAY_AGG(nom ORDER BY nom) FROM DEPARTEMENT),
+            (SELECT ARRAY_AGG(DISTINCT niveau ORDER BY niveau) FROM FORMATION WHERE niveau IS NOT NULL);
+        """)
+        departements, niveaux = cur.fetchone()
+        cur.close()
+        release_connection(conn)
+        return {'departements': departements or [], 'niveaux': niveaux or []}
+
+    except Exception as e:
+        print(f"❌ Erreur chargement filtres : {e}")
+        release_connection(conn)
+        return query_failed({})
+
+
+@cached_query('PROFESSEUR', 'SURVEILLANCE', 'EXAMEN', 'MODULE')
+@timed_query
 def load_exams_per_professor():
     """Nombre d'examens par professeur par jour"""
     query = """
@@ -50,11 +212,13 @@ def load_exams_per_professor():
     conn = get_connection()
     if conn:
         df = pd.read_sql(query, conn)
-        conn.close()
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
 
 
+@cached_query('MODULE', 'FORMATION')
+@timed_query
 def load_students_per_module():
     """Nombre d'étudiants par module"""
     query = """
@@ -63,54 +227,63 @@ def load_students_per_module():
         m.credits,
         m.coefficient,
         f.nom AS formation,
-        COUNT(i.id_etu) AS nb_etudiants
+        m.nb_inscrits AS nb_etudiants
     FROM MODULE m
-    LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
     JOIN FORMATION f ON m.id_form = f.id_form
-    GROUP BY m.nom, m.credits, m.coefficient, f.nom
     ORDER BY nb_etudiants DESC;
     """
     conn = get_connection()
     if conn:
         df = pd.read_sql(query, conn)
-        conn.close()
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
+
+
+# Surveillants pré-agrégés par examen : une ligne par examen en entrée du
+# tri, sans produit examens × surveillants dans un GROUP BY global
+EXAM_SCHEDULE_QUERY = """
+SELECT 
+    e.id_exam,
+    e.date_exam,
+    e.duree_min,
+    e.type_examen,
+    e.session_examen,
+    m.nom AS module,
+    l.nom AS salle,
+    l.capacite,
+    m.nb_inscrits,
+    sv.surveillants,
+    sv.roles
+FROM EXAMEN e
+JOIN MODULE m ON e.id_mod = m.id_mod
+JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+LEFT JOIN (
+    SELECT s.id_exam,
+           STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants,
+           STRING_AGG(DISTINCT s.role, ', ') AS roles
+    FROM SURVEILLANCE s
+    JOIN PROFESSEUR p ON s.id_prof = p.id_prof
+    GROUP BY s.id_exam
+) sv ON e.id_exam = sv.id_exam
+ORDER BY e.date_exam;
+"""
 
 
+@cached_query('EXAMEN', 'MODULE', 'LIEU_EXAMEN', 'SURVEILLANCE', 'PROFESSEUR')
+@timed_query
 def load_exam_schedule():
     """Planning complet des examens"""
-    query = """
-    SELECT 
-        e.id_exam,
-        e.date_exam,
-        e.duree_min,
-        e.type_examen,
-        e.session_examen,
-        m.nom AS module,
-        l.nom AS salle,
-        l.capacite,
-        COUNT(DISTINCT i.id_etu) AS nb_inscrits,
-        STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants,
-        STRING_AGG(DISTINCT s.role, ', ') AS roles
-    FROM EXAMEN e
-    JOIN MODULE m ON e.id_mod = m.id_mod
-    JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-    LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-    LEFT JOIN SURVEILLANCE s ON e.id_exam = s.id_exam
-    LEFT JOIN PROFESSEUR p ON s.id_prof = p.id_prof
-    GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen, 
-             e.session_examen, m.nom, l.nom, l.capacite
-    ORDER BY e.date_exam;
-    """
     conn = get_connection()
     if conn:
-        df = pd.read_sql(query, conn)
-        conn.close()
+        df = pd.read_sql(EXAM_SCHEDULE_QUERY, conn)
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
 
 
+@cached_query('LIEU_EXAMEN', 'EXAMEN', 'MODULE')
+@timed_query
 def load_room_occupancy():
     """Taux d'occupation des salles"""
     query = """
@@ -120,28 +293,24 @@ def load_room_occupancy():
         l.type_lieu,
         l.batiment,
         COUNT(e.id_exam) AS nb_examens,
-        COALESCE(ROUND(AVG(subq.nb_inscrits), 1), 0) AS moy_occupation,
-        COALESCE(ROUND(AVG(subq.nb_inscrits) * 100.0 / l.capacite, 1), 0) AS taux_occupation_pct
+        COALESCE(ROUND(AVG(m.nb_inscrits), 1), 0) AS moy_occupation,
+        COALESCE(ROUND(AVG(m.nb_inscrits) * 100.0 / l.capacite, 1), 0) AS taux_occupation_pct
     FROM LIEU_EXAMEN l
     LEFT JOIN EXAMEN e ON l.id_lieu = e.id_lieu
-    LEFT JOIN (
-        SELECT ex.id_exam, COUNT(i.id_etu) AS nb_inscrits
-        FROM EXAMEN ex
-        JOIN MODULE m ON ex.id_mod = m.id_mod
-        LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-        GROUP BY ex.id_exam
-    ) subq ON e.id_exam = subq.id_exam
+    LEFT JOIN MODULE m ON e.id_mod = m.id_mod
     GROUP BY l.id_lieu, l.nom, l.capacite, l.type_lieu, l.batiment
     ORDER BY taux_occupation_pct DESC;
     """
     conn = get_connection()
     if conn:
         df = pd.read_sql(query, conn)
-        conn.close()
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
 
 
+@cached_query('EXAMEN', 'MODULE', 'LIEU_EXAMEN', 'INSCRIPTION')
+@timed_query
 def load_student_exam_schedule(student_id):
     """Planning d'examens pour un étudiant spécifique"""
     query = """
@@ -164,13 +333,15 @@ def load_student_exam_schedule(student_id):
     conn = get_connection()
     if conn:
         df = pd.read_sql(query, conn, params=(student_id,))
-        conn.close()
+        release_connection(conn)
         return df
-    return pd.DataFrame()
+    return query_failed(pd.DataFrame())
 
 
+@cached_query('INSCRIPTION', 'ETUDIANT', 'EXAMEN', 'MODULE', 'SURVEILLANCE', 'PROFESSEUR', 'LIEU_EXAMEN')
+@timed_query
 def get_constraint_violations():
-    """Détecte les violations de contraintes potentielles"""
+    """Violations de contraintes, maintenues par trigger dans VIOLATION_CONTRAINTE"""
     violations = {
         "students_multiple_exams": [],
         "professors_overload": [],
@@ -179,240 +350,189 @@ def get_constraint_violations():
 
     conn = get_connection()
     if not conn:
-        return violations
-
-    cur = conn.cursor()
-
-    # 1️⃣ Étudiants avec plusieurs examens le même jour
-    cur.execute("""
-        SELECT i.id_etu, e.nom || ' ' || e.prenom AS etudiant, 
-               ex.date_exam::date AS jour, COUNT(*) AS nb_examens
-        FROM INSCRIPTION i
-        JOIN ETUDIANT e ON i.id_etu = e.id_etu
-        JOIN EXAMEN ex ON i.id_mod = ex.id_mod
-        GROUP BY i.id_etu, etudiant, jour
-        HAVING COUNT(*) > 1;
-    """)
-    violations["students_multiple_exams"] = cur.fetchall()
-
-    # 2️⃣ Professeurs avec plus de 3 examens/jour
-    cur.execute("""
-        SELECT s.id_prof, p.nom || ' ' || p.prenom AS professeur,
-               e.date_exam::date AS jour, COUNT(*) AS nb_examens
-        FROM SURVEILLANCE s
-        JOIN PROFESSEUR p ON s.id_prof = p.id_prof
-        JOIN EXAMEN e ON s.id_exam = e.id_exam
-        GROUP BY s.id_prof, professeur, jour
-        HAVING COUNT(*) > 3;
-    """)
-    violations["professors_overload"] = cur.fetchall()
-
-    # 3️⃣ Salles dépassant leur capacité
-    cur.execute("""
-        SELECT e.id_exam, l.nom AS salle, l.capacite,
-               COUNT(i.id_etu) AS nb_inscrits
-        FROM EXAMEN e
-        JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-        JOIN MODULE m ON e.id_mod = m.id_mod
-        LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-        GROUP BY e.id_exam, l.nom, l.capacite
-        HAVING COUNT(i.id_etu) > l.capacite;
-    """)
-    violations["room_overcapacity"] = cur.fetchall()
-
-    cur.close()
-    conn.close()
-
-    return violations
-
-
-def get_dashboard_stats():
-    """Statistiques générales pour le dashboard"""
-    conn = get_connection()
-    if not conn:
-        return {}
+        return query_failed(violations)
 
-    cur = conn.cursor()
-    stats = {}
-
-    # Nombre total d'étudiants
-    cur.execute("SELECT COUNT(*) FROM ETUDIANT;")
-    stats['total_students'] = cur.fetchone()[0]
+    try:
+        cur = conn.cursor()
 
-    # Nombre total d'examens
-    cur.execute("SELECT COUNT(*) FROM EXAMEN;")
-    stats['total_exams'] = cur.fetchone()[0]
+        # 1️⃣ Étudiants avec plusieurs examens le même jour
+        cur.execute("""
+            SELECT v.id_ref, e.nom || ' ' || e.prenom AS etudiant, v.jour, v.nb
+            FROM VIOLATION_CONTRAINTE v
+            JOIN ETUDIANT e ON v.id_ref = e.id_etu
+            WHERE v.type_violation = 'etudiant_jour'
+            ORDER BY v.jour, etudiant;
+        """)
+        violations["students_multiple_exams"] = cur.fetchall()
 
-    # Nombre de professeurs
-    cur.execute("SELECT COUNT(*) FROM PROFESSEUR;")
-    stats['total_professors'] = cur.fetchone()[0]
+        # 2️⃣ Professeurs avec plus de 3 examens/jour
+        cur.execute("""
+            SELECT v.id_ref, p.nom || ' ' || p.prenom AS professeur, v.jour, v.nb
+            FROM VIOLATION_CONTRAINTE v
+            JOIN PROFESSEUR p ON v.id_ref = p.id_prof
+            WHERE v.type_violation = 'professeur_jour'
+            ORDER BY v.jour, professeur;
+        """)
+        violations["professors_overload"] = cur.fetchall()
 
-    # Nombre de salles
-    cur.execute("SELECT COUNT(*) FROM LIEU_EXAMEN;")
-    stats['total_rooms'] = cur.fetchone()[0]
+        # 3️⃣ Salles dépassant leur capacité
+        cur.execute("""
+            SELECT v.id_ref, l.nom AS salle, l.capacite, v.nb
+            FROM VIOLATION_CONTRAINTE v
+            JOIN EXAMEN e ON v.id_ref = e.id_exam
+            JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+            WHERE v.type_violation = 'salle_capacite'
+            ORDER BY v.jour, v.id_ref;
+        """)
+        violations["room_overcapacity"] = cur.fetchall()
 
-    # Capacité totale
-    cur.execute("SELECT SUM(capacite) FROM LIEU_EXAMEN;")
-    stats['total_capacity'] = cur.fetchone()[0]
+        cur.close()
+        release_connection(conn)
 
-    cur.close()
-    conn.close()
+    except Exception as e:
+        print(f"❌ Erreur lecture violations : {e}")
+        release_connection(conn)
+        return query_failed(violations)
 
-    return stats
+    return violations
 
 
-# ==========================================
-# FONCTIONS POUR PLANIFICATION D'EXAMENS
-# ==========================================
-
-def get_available_rooms(date_exam, duree_min):
-    """Récupère les salles disponibles pour une date/heure donnée"""
+# Tuiles et séries des graphiques du tableau de bord en un seul aller-retour :
+# compteurs en sous-requêtes scalaires, séries agrégées côté serveur (json_agg)
+DASHBOARD_SUMMARY_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM ETUDIANT) AS total_students,
+    (SELECT COUNT(*) FROM EXAMEN) AS total_exams,
+    (SELECT COUNT(*) FROM PROFESSEUR) AS total_professors,
+    (SELECT COUNT(*) FROM LIEU_EXAMEN) AS total_rooms,
+    (SELECT SUM(capacite) FROM LIEU_EXAMEN) AS total_capacity,
+    (
+        SELECT json_agg(json_build_object(
+                   'module', m.nom,
+                   'credits', m.credits,
+                   'coefficient', m.coefficient,
+                   'formation', f.nom,
+                   'nb_etudiants', m.nb_inscrits
+               ) ORDER BY m.nb_inscrits DESC)
+        FROM MODULE m
+        JOIN FORMATION f ON m.id_form = f.id_form
+    ) AS students_per_module,
+    (
+        SELECT json_agg(json_build_object(
+                   'departement', dept.nom,
+                   'nb_etudiants', dept.nb_etudiants
+               ) ORDER BY dept.nom)
+        FROM (
+            SELECT d.nom, COUNT(*) AS nb_etudiants
+            FROM ETUDIANT e
+            JOIN FORMATION f ON e.id_form = f.id_form
+            JOIN DEPARTEMENT d ON f.id_dept = d.id_dept
+            GROUP BY d.nom
+        ) dept
+    ) AS students_per_department;
+"""
+
+DASHBOARD_TILES = ['total_students', 'total_exams', 'total_professors', 'total_rooms', 'total_capacity']
+
+
+@timed_query
+def get_dashboard_summary():
+    """Tableau de bord complet en une requête
+
+    Renvoie les tuiles (mêmes clés que get_dashboard_stats) et les deux séries :
+    'students_per_module' (module, credits, coefficient, formation, nb_etudiants)
+    et 'students_per_department' (departement, nb_etudiants).
+    En erreur, renvoie query_failed({}) : à appeler via get_dashboard_summary_cached.
+    """
     conn = get_connection()
     if not conn:
-        return []
+        return query_failed({})
 
     try:
         cur = conn.cursor()
-
-        # Salles non occupées durant ce créneau
-        cur.execute("""
-        SELECT l.id_lieu, l.nom, l.capacite, l.type_lieu, l.batiment
-        FROM LIEU_EXAMEN l
-        WHERE l.id_lieu NOT IN (
-            SELECT e.id_lieu
-            FROM EXAMEN e
-            WHERE 
-                %s < (e.date_exam + (e.duree_min || ' minutes')::interval)
-                AND (%s + (%s || ' minutes')::interval) > e.date_exam
-        )
-        ORDER BY l.capacite DESC;
-        """, (date_exam, date_exam, duree_min))
-
-        rooms = cur.fetchall()
+        cur.execute(DASHBOARD_SUMMARY_QUERY)
+        row = cur.fetchone()
         cur.close()
-        conn.close()
+        release_connection(conn)
 
-        return [{
-            'id_lieu': r[0],
-            'nom': r[1],
-            'capacite': r[2],
-            'type_lieu': r[3],
-            'batiment': r[4]
-        } for r in rooms]
+        summary = dict(zip(DASHBOARD_TILES, row[:5]))
+        summary['students_per_module'] = pd.DataFrame(
+            row[5] or [], columns=['module', 'credits', 'coefficient', 'formation', 'nb_etudiants']
+        )
+        summary['students_per_department'] = pd.DataFrame(
+            row[6] or [], columns=['departement', 'nb_etudiants']
+        )
+        return summary
 
     except Exception as e:
-        print(f"❌ Erreur récupération salles : {e}")
+        print(f"❌ Erreur chargement tableau de bord : {e}")
         if conn:
-            conn.close()
-        return []
-
+            release_connection(conn)
+        return query_failed({})
 
-def get_all_modules():
-    """Récupère tous les modules disponibles"""
-    conn = get_connection()
-    if not conn:
-        return []
 
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-        SELECT m.id_mod, m.nom, m.credits, m.coefficient, f.nom AS formation, 
-               COUNT(i.id_etu) AS nb_inscrits
-        FROM MODULE m
-        JOIN FORMATION f ON m.id_form = f.id_form
-        LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-        GROUP BY m.id_mod, m.nom, m.credits, m.coefficient, f.nom
-        ORDER BY f.nom, m.nom;
-        """)
+# Variante mise en cache (page 🏠 Dashboard) : invalidée par les écritures sur ces tables
+get_dashboard_summary_cached = cached_query(
+    'ETUDIANT', 'EXAMEN', 'PROFESSEUR', 'LIEU_EXAMEN', 'MODULE', 'FORMATION', 'DEPARTEMENT'
+)(get_dashboard_summary)
 
-        modules = cur.fetchall()
-        cur.close()
-        conn.close()
 
-        return [{
-            'id_mod': m[0],
-            'nom': m[1],
-            'credits': m[2],
-            'coefficient': m[3],
-            'formation': m[4],
-            'nb_inscrits': m[5]
-        } for m in modules]
+def get_dashboard_stats():
+    """Statistiques générales pour le dashboard (tuiles du résumé mis en cache)"""
+    summary = get_dashboard_summary_cached()
+    return {key: summary[key] for key in DASHBOARD_TILES if key in summary}
 
-    except Exception as e:
-        print(f"❌ Erreur récupération modules : {e}")
-        if conn:
-            conn.close()
-        return []
 
+# ==========================================
+# FONCTIONS POUR PLANIFICATION D'EXAMENS
+# ==========================================
 
-def get_all_professors():
-    """Récupère tous les professeurs"""
+@cached_query('EXAMEN')
+@timed_query
+def load_occupancy_index():
+    """Index en mémoire des créneaux occupés, reconstruit seulement après une écriture"""
     conn = get_connection()
     if not conn:
-        return []
+        return query_failed(None)
 
     try:
         cur = conn.cursor()
-        cur.execute("""
-        SELECT p.id_prof, p.nom, p.prenom, p.specialite, d.nom AS departement
-        FROM PROFESSEUR p
-        JOIN DEPARTEMENT d ON p.id_dept = d.id_dept
-        ORDER BY p.nom, p.prenom;
-        """)
-
-        profs = cur.fetchall()
+        cur.execute("SELECT date_exam, id_lieu, duree_min FROM EXAMEN;")
+        index = OccupancyIndex(cur.fetchall())
         cur.close()
-        conn.close()
-
-        return [{
-            'id_prof': p[0],
-            'nom': p[1],
-            'prenom': p[2],
-            'specialite': p[3],
-            'departement': p[4]
-        } for p in profs]
+        release_connection(conn)
+        return index
 
     except Exception as e:
-        print(f"❌ Erreur récupération professeurs : {e}")
+        print(f"❌ Erreur chargement occupation des salles : {e}")
         if conn:
-            conn.close()
-        return []
+            release_connection(conn)
+        return query_failed(None)
 
 
-def get_all_rooms():
-    """Récupère toutes les salles"""
-    conn = get_connection()
-    if not conn:
-        return []
+@timed_query
+def get_available_rooms_many(slots):
+    """Salles disponibles pour plusieurs créneaux en un seul appel
 
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-        SELECT id_lieu, nom, capacite, type_lieu, batiment, equipements
-        FROM LIEU_EXAMEN
-        ORDER BY capacite DESC;
-        """)
+    slots : itérable de (date_exam, duree_min). Renvoie une liste de salles
+    par créneau, dans le même ordre. Salles et occupation viennent du cache :
+    aucune requête tant qu'EXAMEN et LIEU_EXAMEN ne changent pas.
+    """
+    slots = list(slots)
+    occupancy = load_occupancy_index()
+    if occupancy is None:
+        return [[] for _ in slots]
 
-        rooms = cur.fetchall()
-        cur.close()
-        conn.close()
+    rooms = get_all_rooms()
+    return occupancy.free_rooms_many(rooms, slots)
 
-        return [{
-            'id_lieu': r[0],
-            'nom': r[1],
-            'capacite': r[2],
-            'type_lieu': r[3],
-            'batiment': r[4],
-            'equipements': r[5]
-        } for r in rooms]
 
-    except Exception as e:
-        print(f"❌ Erreur récupération salles : {e}")
-        if conn:
-            conn.close()
-        return []
+def get_available_rooms(date_exam, duree_min):
+    """Récupère les salles disponibles pour une date/heure donnée"""
+    return get_available_rooms_many([(date_exam, duree_min)])[0]
 
 
+@timed_query
 def create_exam(date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu):
     """Crée un nouvel examen"""
     conn = get_connection()
@@ -421,6 +541,7 @@ def create_exam(date_exam, duree_min, type_examen, session_examen, id_mod, id_li
 
     try:
         cur = conn.cursor()
+        check_rooms = guard_room_overlaps(cur)
         cur.execute("""
         INSERT INTO EXAMEN (date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu)
         VALUES (%s, %s, %s, %s, %s, %s)
@@ -428,21 +549,39 @@ def create_exam(date_exam, duree_min, type_examen, session_examen, id_mod, id_li
         """, (date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu))
 
         id_exam = cur.fetchone()[0]
+        if check_rooms and room_conflicts(cur, [id_exam]):
+            print(f"❌ Salle {id_lieu} déjà occupée sur ce créneau")
+            conn.rollback()
+            release_connection(conn)
+            return None
+
+        # Planning précalculé des inscrits du module (même transaction)
+        cur.execute("SELECT rafraichir_planning_etudiants(%s);", ([id_exam],))
+        notify_tables(cur, 'EXAMEN', key=id_exam)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('EXAMEN')
 
         print(f"✅ Examen créé : ID {id_exam}")
         return id_exam
 
+    except errors.ExclusionViolation:
+        print(f"❌ Salle {id_lieu} déjà occupée sur ce créneau")
+        if conn:
+            conn.rollback()
+            release_connection(conn)
+        return None
+
     except Exception as e:
         print(f"❌ Erreur création examen : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return None
 
 
+@timed_query
 def assign_surveillance(id_exam, id_prof, role):
     """Assigne un surveillant à un examen"""
     conn = get_connection()
@@ -456,9 +595,12 @@ def assign_surveillance(id_exam, id_prof, role):
         VALUES (%s, %s, %s);
         """, (id_exam, id_prof, role))
 
+        cur.execute("SELECT rafraichir_planning_etudiants(%s);", ([id_exam],))
+        notify_tables(cur, 'SURVEILLANCE', key=id_exam)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('SURVEILLANCE')
 
         print(f"✅ Surveillant assigné : Prof {id_prof} ({role})")
         return True
@@ -467,10 +609,11 @@ def assign_surveillance(id_exam, id_prof, role):
         print(f"❌ Erreur assignation surveillant : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
+@timed_query
 def update_exam(id_exam, date_exam, duree_min, type_examen, session_examen, id_lieu):
     """Modifie un examen existant"""
     conn = get_connection()
@@ -479,6 +622,7 @@ def update_exam(id_exam, date_exam, duree_min, type_examen, session_examen, id_l
 
     try:
         cur = conn.cursor()
+        check_rooms = guard_room_overlaps(cur)
         cur.execute("""
         UPDATE EXAMEN
         SET date_exam = %s, duree_min = %s, type_examen = %s, 
@@ -486,21 +630,38 @@ def update_exam(id_exam, date_exam, duree_min, type_examen, session_examen, id_l
         WHERE id_exam = %s;
         """, (date_exam, duree_min, type_examen, session_examen, id_lieu, id_exam))
 
+        if check_rooms and room_conflicts(cur, [id_exam]):
+            print(f"❌ Salle {id_lieu} déjà occupée sur ce créneau")
+            conn.rollback()
+            release_connection(conn)
+            return False
+
+        cur.execute("SELECT rafraichir_planning_etudiants(%s);", ([id_exam],))
+        notify_tables(cur, 'EXAMEN', key=id_exam)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('EXAMEN')
 
         print(f"✅ Examen {id_exam} modifié")
         return True
 
+    except errors.ExclusionViolation:
+        print(f"❌ Salle {id_lieu} déjà occupée sur ce créneau")
+        if conn:
+            conn.rollback()
+            release_connection(conn)
+        return False
+
     except Exception as e:
         print(f"❌ Erreur modification examen : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
+@timed_query
 def delete_exam(id_exam):
     """Supprime un examen"""
     conn = get_connection()
@@ -516,9 +677,12 @@ def delete_exam(id_exam):
         # Puis l'examen
         cur.execute("DELETE FROM EXAMEN WHERE id_exam = %s;", (id_exam,))
 
+        cur.execute("SELECT rafraichir_planning_etudiants(%s);", ([id_exam],))
+        notify_tables(cur, 'EXAMEN', 'SURVEILLANCE', key=id_exam)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('EXAMEN', 'SURVEILLANCE')
 
         print(f"✅ Examen {id_exam} supprimé")
         return True
@@ -527,84 +691,11 @@ def delete_exam(id_exam):
         print(f"❌ Erreur suppression examen : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
-def get_exam_details(id_exam):
-    """Récupère les détails d'un examen"""
-    conn = get_connection()
-    if not conn:
-        return None
-
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-        SELECT 
-            e.id_exam,
-            e.date_exam,
-            e.duree_min,
-            e.type_examen,
-            e.session_examen,
-            m.id_mod,
-            m.nom AS module,
-            l.id_lieu,
-            l.nom AS salle,
-            l.capacite,
-            COUNT(i.id_etu) AS nb_inscrits
-        FROM EXAMEN e
-        JOIN MODULE m ON e.id_mod = m.id_mod
-        JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-        LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-        WHERE e.id_exam = %s
-        GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen, 
-                 e.session_examen, m.id_mod, m.nom, l.id_lieu, l.nom, l.capacite;
-        """, (id_exam,))
-
-        exam = cur.fetchone()
-
-        # Récupérer les surveillants
-        cur.execute("""
-        SELECT p.id_prof, p.nom, p.prenom, s.role
-        FROM SURVEILLANCE s
-        JOIN PROFESSEUR p ON s.id_prof = p.id_prof
-        WHERE s.id_exam = %s;
-        """, (id_exam,))
-
-        surveillants = cur.fetchall()
-
-        cur.close()
-        conn.close()
-
-        if exam:
-            return {
-                'id_exam': exam[0],
-                'date_exam': exam[1],
-                'duree_min': exam[2],
-                'type_examen': exam[3],
-                'session_examen': exam[4],
-                'id_mod': exam[5],
-                'module': exam[6],
-                'id_lieu': exam[7],
-                'salle': exam[8],
-                'capacite': exam[9],
-                'nb_inscrits': exam[10],
-                'surveillants': [{
-                    'id_prof': s[0],
-                    'nom': s[1],
-                    'prenom': s[2],
-                    'role': s[3]
-                } for s in surveillants]
-            }
-        return None
-
-    except Exception as e:
-        print(f"❌ Erreur récupération détails examen : {e}")
-        if conn:
-            conn.close()
-        return None
-
-
+@timed_query
 def remove_surveillance(id_exam, id_prof):
     """Retire un surveillant d'un examen"""
     conn = get_connection()
@@ -618,9 +709,12 @@ def remove_surveillance(id_exam, id_prof):
         WHERE id_exam = %s AND id_prof = %s;
         """, (id_exam, id_prof))
 
+        cur.execute("SELECT rafraichir_planning_etudiants(%s);", ([id_exam],))
+        notify_tables(cur, 'SURVEILLANCE', key=id_exam)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('SURVEILLANCE')
 
         print(f"✅ Surveillant retiré de l'examen {id_exam}")
         return True
@@ -629,10 +723,11 @@ def remove_surveillance(id_exam, id_prof):
         print(f"❌ Erreur retrait surveillant : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
+@timed_query
 def check_professor_availability(id_prof, date_exam):
     """Vérifie le nombre d'examens d'un prof un jour donné"""
     conn = get_connection()
@@ -651,87 +746,65 @@ def check_professor_availability(id_prof, date_exam):
 
         count = cur.fetchone()[0]
         cur.close()
-        conn.close()
+        release_connection(conn)
 
         return count
 
     except Exception as e:
         print(f"❌ Erreur vérification disponibilité : {e}")
         if conn:
-            conn.close()
+            release_connection(conn)
         return None
 
 
-def load_student_own_exams(username):
-    """Récupère les examens d'un étudiant connecté (basé sur son username)"""
+# Lecture d'une plage de la clé primaire de PLANNING_ETUDIANT (migration 8),
+# reconstruit à chaque publication : pas de jointure ni d'agrégat par vue
+STUDENT_EXAMS_QUERY = """
+SELECT
+    id_exam,
+    date_exam,
+    duree_min,
+    type_examen,
+    session_examen,
+    module,
+    credits,
+    coefficient,
+    salle,
+    batiment,
+    capacite,
+    statut,
+    note,
+    surveillants
+FROM PLANNING_ETUDIANT
+WHERE id_etu = %s
+ORDER BY date_exam, id_exam;
+"""
+
+
+# PLANNING_ETUDIANT est réécrite par trigger quand ces tables changent ;
+# PLANNING_VERSION (NOTIFY de chaque publication) couvre les écritures hors application
+@cached_query('EXAMEN', 'SURVEILLANCE', 'INSCRIPTION', 'MODULE', 'LIEU_EXAMEN', 'PROFESSEUR',
+              'PLANNING_VERSION')
+@timed_query
+def load_student_own_exams(id_etu):
+    """Examens d'un étudiant (id_etu résolu à la connexion : user['id_etu'])"""
     conn = get_connection()
     if not conn:
-        return pd.DataFrame()
+        return query_failed(pd.DataFrame())
 
     try:
-        # Récupérer l'id_etu à partir du username
-        cur = conn.cursor()
-
-        # Trouver l'étudiant correspondant au username
-        cur.execute("""
-        SELECT e.id_etu 
-        FROM ETUDIANT e
-        JOIN UTILISATEURS u ON LOWER(e.email) = LOWER(u.email)
-        WHERE u.username = %s;
-        """, (username,))
-
-        result = cur.fetchone()
-
-        if not result:
-            cur.close()
-            conn.close()
-            return pd.DataFrame()
-
-        id_etu = result[0]
-
-        # Récupérer les examens de cet étudiant
-        query = """
-        SELECT 
-            e.id_exam,
-            e.date_exam,
-            e.duree_min,
-            e.type_examen,
-            e.session_examen,
-            m.nom AS module,
-            m.credits,
-            m.coefficient,
-            l.nom AS salle,
-            l.batiment,
-            l.capacite,
-            i.statut,
-            i.note,
-            STRING_AGG(DISTINCT p.nom || ' ' || p.prenom, ', ') AS surveillants
-        FROM INSCRIPTION i
-        JOIN MODULE m ON i.id_mod = m.id_mod
-        JOIN EXAMEN e ON m.id_mod = e.id_mod
-        JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-        LEFT JOIN SURVEILLANCE s ON e.id_exam = s.id_exam
-        LEFT JOIN PROFESSEUR p ON s.id_prof = p.id_prof
-        WHERE i.id_etu = %s
-        GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen, 
-                 e.session_examen, m.nom, m.credits, m.coefficient,
-                 l.nom, l.batiment, l.capacite, i.statut, i.note
-        ORDER BY e.date_exam;
-        """
-
-        df = pd.read_sql(query, conn, params=(id_etu,))
-        cur.close()
-        conn.close()
-
+        df = pd.read_sql(STUDENT_EXAMS_QUERY, conn, params=(id_etu,))
+        release_connection(conn)
         return df
 
     except Exception as e:
         print(f"❌ Erreur récupération examens étudiant : {e}")
-        if conn:
-            conn.close()
-        return pd.DataFrame()
+        release_connection(conn)
+        return query_failed(pd.DataFrame())
 
 
+@request_memo
+@timed_query
 def get_student_id_from_username(username):
     """Récupère l'ID d'un étudiant à partir de son username"""
     conn = get_connection()
@@ -742,15 +815,15 @@ def get_student_id_from_username(username):
         cur = conn.cursor()
         cur.execute("""
         SELECT e.id_etu, e.nom, e.prenom, e.email, f.nom AS formation
-        FROM ETUDIANT e
-        JOIN UTILISATEURS u ON LOWER(e.email) = LOWER(u.email)
+        FROM UTILISATEURS u
+        JOIN ETUDIANT e ON e.id_etu = u.id_etu
         JOIN FORMATION f ON e.id_form = f.id_form
         WHERE u.username = %s;
         """, (username,))
 
         result = cur.fetchone()
         cur.close()
-        conn.close()
+        release_connection(conn)
 
         if result:
             return {
@@ -765,115 +838,64 @@ def get_student_id_from_username(username):
     except Exception as e:
         print(f"❌ Erreur récupération ID étudiant : {e}")
         if conn:
-            conn.close()
+            release_connection(conn)
         return None
 
 
-def get_all_rooms():
-    """Récupère toutes les salles"""
+# Une ligne par surveillance du professeur, collègues lus par examen (LATERAL)
+PROFESSOR_SURVEILLANCES_QUERY = """
+SELECT 
+    e.id_exam,
+    e.date_exam,
+    e.duree_min,
+    e.type_examen,
+    e.session_examen,
+    m.nom AS module,
+    f.nom AS formation,
+    f.niveau,
+    l.nom AS salle,
+    l.batiment,
+    l.capacite,
+    m.nb_inscrits,
+    s.role,
+    autres.autres_surveillants
+FROM SURVEILLANCE s
+JOIN EXAMEN e ON s.id_exam = e.id_exam
+JOIN MODULE m ON e.id_mod = m.id_mod
+JOIN FORMATION f ON m.id_form = f.id_form
+JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+LEFT JOIN LATERAL (
+    SELECT STRING_AGG(DISTINCT p2.nom || ' ' || p2.prenom, ', ') AS autres_surveillants
+    FROM SURVEILLANCE s2
+    JOIN PROFESSEUR p2 ON s2.id_prof = p2.id_prof
+    WHERE s2.id_exam = e.id_exam AND s2.id_prof <> s.id_prof
+) autres ON TRUE
+WHERE s.id_prof = %s
+ORDER BY e.date_exam;
+"""
+
+
+@cached_query('EXAMEN', 'MODULE', 'LIEU_EXAMEN', 'SURVEILLANCE', 'PROFESSEUR')
+@timed_query
+def load_professor_surveillances(id_prof):
+    """Surveillances d'un professeur (id_prof résolu à la connexion : user['id_prof'])"""
     conn = get_connection()
     if not conn:
-        return []
+        return query_failed(pd.DataFrame())
 
     try:
-        cur = conn.cursor()
-        cur.execute("""
-        SELECT id_lieu, nom, capacite, type_lieu, batiment
-        FROM LIEU_EXAMEN
-        ORDER BY nom;
-        """)
-
-        rooms = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        return [{
-            'id_lieu': r[0],
-            'nom': r[1],
-            'capacite': r[2],
-            'type_lieu': r[3],
-            'batiment': r[4] if len(r) > 4 else 'N/A'
-        } for r in rooms]
+        df = pd.read_sql(PROFESSOR_SURVEILLANCES_QUERY, conn, params=(id_prof,))
+        release_connection(conn)
+        return df
 
     except Exception as e:
-        print(f"❌ Erreur get_all_rooms: {e}")
-        if conn:
-            conn.close()
-        return []
+        print(f"❌ Erreur récupération surveillances prof : {e}")
+        release_connection(conn)
+        return query_failed(pd.DataFrame())
 
 
-
-def load_professor_surveillances(username):
-        """Récupère les surveillances d'un professeur (basé sur son username)"""
-        conn = get_connection()
-        if not conn:
-            return pd.DataFrame()
-
-        try:
-            cur = conn.cursor()
-
-            # Trouver le professeur correspondant au username
-            cur.execute("""
-            SELECT p.id_prof 
-            FROM PROFESSEUR p
-            JOIN UTILISATEURS u ON LOWER(p.email) = LOWER(u.email)
-            WHERE u.username = %s;
-            """, (username,))
-
-            result = cur.fetchone()
-
-            if not result:
-                cur.close()
-                conn.close()
-                return pd.DataFrame()
-
-            id_prof = result[0]
-
-            # Récupérer les surveillances de ce professeur
-            query = """
-            SELECT 
-                e.id_exam,
-                e.date_exam,
-                e.duree_min,
-                e.type_examen,
-                e.session_examen,
-                m.nom AS module,
-                f.nom AS formation,
-                f.niveau,
-                l.nom AS salle,
-                l.batiment,
-                l.capacite,
-                COUNT(DISTINCT i.id_etu) AS nb_inscrits,
-                s.role,
-                STRING_AGG(DISTINCT p2.nom || ' ' || p2.prenom, ', ') 
-                    FILTER (WHERE p2.id_prof != %s) AS autres_surveillants
-            FROM SURVEILLANCE s
-            JOIN EXAMEN e ON s.id_exam = e.id_exam
-            JOIN MODULE m ON e.id_mod = m.id_mod
-            JOIN FORMATION f ON m.id_form = f.id_form
-            JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-            LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-            LEFT JOIN SURVEILLANCE s2 ON e.id_exam = s2.id_exam
-            LEFT JOIN PROFESSEUR p2 ON s2.id_prof = p2.id_prof
-            WHERE s.id_prof = %s
-            GROUP BY e.id_exam, e.date_exam, e.duree_min, e.type_examen, 
-                     e.session_examen, m.nom, f.nom, f.niveau,
-                     l.nom, l.batiment, l.capacite, s.role
-            ORDER BY e.date_exam;
-            """
-
-            df = pd.read_sql(query, conn, params=(id_prof, id_prof))
-            cur.close()
-            conn.close()
-
-            return df
-
-        except Exception as e:
-            print(f"❌ Erreur récupération surveillances prof : {e}")
-            if conn:
-                conn.close()
-            return pd.DataFrame()
-
+@request_memo
+@timed_query
 def get_professor_id_from_username(username):
         """Récupère l'ID d'un professeur à partir de son username"""
         conn = get_connection()
@@ -884,15 +906,15 @@ def get_professor_id_from_username(username):
             cur = conn.cursor()
             cur.execute("""
             SELECT p.id_prof, p.nom, p.prenom, p.email, d.nom AS departement, p.specialite
-            FROM PROFESSEUR p
-            JOIN UTILISATEURS u ON LOWER(p.email) = LOWER(u.email)
+            FROM UTILISATEURS u
+            JOIN PROFESSEUR p ON p.id_prof = u.id_prof
             JOIN DEPARTEMENT d ON p.id_dept = d.id_dept
             WHERE u.username = %s;
             """, (username,))
 
             result = cur.fetchone()
             cur.close()
-            conn.close()
+            release_connection(conn)
 
             if result:
                 return {
@@ -908,5 +930,5 @@ def get_professor_id_from_username(username):
         except Exception as e:
             print(f"❌ Erreur récupération ID professeur : {e}")
             if conn:
-                conn.close()
+                release_connection(conn)
             return None
\ No newline at end of file
@@ -0,0 +1,237 @@
+# frontend/repository.py
+from datetime import datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+from db_utils import get_connection, release_connection
+from instrumentation import timed_query
+from cache import cached_query, query_failed
+
+
+# ==========================================
+# TYPES DE LIGNES
+# ==========================================
+# Tuples nommés : pas de dictionnaire par ligne, accès par attribut
+# (r.nom) ou par position (r[0]) pour le solveur.
+
+class Module(NamedTuple):
+    id_mod: int
+    nom: str
+    credits: int
+    coefficient: Decimal
+    formation: str
+    id_form: int
+    niveau: str
+    nb_inscrits: int
+
+
+class Professor(NamedTuple):
+    id_prof: int
+    nom: str
+    prenom: str
+    specialite: str
+    id_dept: int
+    departement: str
+
+
+class Room(NamedTuple):
+    id_lieu: int
+    nom: str
+    capacite: int
+    type_lieu: str
+    batiment: str
+    equipements: str
+
+
+class Supervisor(NamedTuple):
+    id_prof: int
+    nom: str
+    prenom: str
+    role: str
+
+
+class ExamDetails(NamedTuple):
+    id_exam: int
+    date_exam: datetime
+    duree_min: int
+    type_examen: str
+    session_examen: str
+    id_mod: int
+    module: str
+    id_lieu: int
+    salle: str
+    capacite: int
+    nb_inscrits: int
+    surveillants: tuple = ()
+
+
+# ==========================================
+# LECTURES SUR UN CURSEUR
+# ==========================================
+# Utilisables dans une transaction existante (instantané du planificateur) :
+# where / order_by sont des fragments SQL fixes, les valeurs passent par params.
+
+def fetch_modules(cur, where="TRUE", params=None, order_by="f.nom, m.nom"):
+    cur.execute(f"""
+    SELECT m.id_mod, m.nom, m.credits, m.coefficient, f.nom AS formation,
+           f.id_form, f.niveau, m.nb_inscrits
+    FROM MODULE m
+    JOIN FORMATION f ON m.id_form = f.id_form
+    WHERE {where}
+    ORDER BY {order_by};
+    """, params)
+    return [Module._make(r) for r in cur.fetchall()]
+
+
+def fetch_professors(cur, where="TRUE", params=None, order_by="p.nom, p.prenom"):
+    cur.execute(f"""
+    SELECT p.id_prof, p.nom, p.prenom, p.specialite, p.id_dept, d.nom AS departement
+    FROM PROFESSEUR p
+    LEFT JOIN DEPARTEMENT d ON p.id_dept = d.id_dept
+    WHERE {where}
+    ORDER BY {order_by};
+    """, params)
+    return [Professor._make(r) for r in cur.fetchall()]
+
+
+def fetch_rooms(cur, order_by="capacite DESC, id_lieu"):
+    cur.execute(f"""
+    SELECT id_lieu, nom, capacite, type_lieu, batiment, equipements
+    FROM LIEU_EXAMEN
+    ORDER BY {order_by};
+    """)
+    return [Room._make(r) for r in cur.fetchall()]
+
+
+def fetch_exam_details(cur, ids):
+    """{id_exam: ExamDetails} des examens demandés (deux requêtes, quel que soit leur nombre)"""
+    cur.execute("""
+    SELECT
+        e.id_exam,
+        e.date_exam,
+        e.duree_min,
+        e.type_examen,
+        e.session_examen,
+        m.id_mod,
+        m.nom AS module,
+        l.id_lieu,
+        l.nom AS salle,
+        l.capacite,
+        m.nb_inscrits
+    FROM EXAMEN e
+    JOIN MODULE m ON e.id_mod = m.id_mod
+    JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
+    WHERE e.id_exam = ANY(%s);
+    """, (list(ids),))
+    exams = cur.fetchall()
+
+    cur.execute("""
+    SELECT s.id_exam, p.id_prof, p.nom, p.prenom, s.role
+    FROM SURVEILLANCE s
+    JOIN PROFESSEUR p ON s.id_prof = p.id_prof
+    WHERE s.id_exam = ANY(%s)
+    ORDER BY s.id_exam, p.nom;
+    """, (list(ids),))
+
+    surveillants = {}
+    for row in cur.fetchall():
+        surveillants.setdefault(row[0], []).append(Supervisor._make(row[1:]))
+
+    return {e[0]: ExamDetails(*e, tuple(surveillants.get(e[0], ()))) for e in exams}
+
+
+# ==========================================
+# HELPERS DE L'APPLICATION
+# ==========================================
+
+@cached_query('MODULE', 'FORMATION')
+@timed_query
+def get_all_modules():
+    """Récupère tous les modules disponibles"""
+    conn = get_connection()
+    if not conn:
+        return query_failed([])
+
+    try:
+        cur = conn.cursor()
+        modules = fetch_modules(cur)
+        cur.close()
+        release_connection(conn)
+        return modules
+
+    except Exception as e:
+        print(f"❌ Erreur récupération modules : {e}")
+        release_connection(conn)
+        return query_failed([])
+
+
+@cached_query('PROFESSEUR', 'DEPARTEMENT')
+@timed_query
+def get_all_professors():
+    """Récupère tous les professeurs"""
+    conn = get_connection()
+    if not conn:
+        return query_failed([])
+
+    try:
+        cur = conn.cursor()
+        profs = fetch_professors(cur)
+        cur.close()
+        release_connection(conn)
+        return profs
+
+    except Exception as e:
+        print(f"❌ Erreur récupération professeurs : {e}")
+        release_connection(conn)
+        return query_failed([])
+
+
+@cached_query('LIEU_EXAMEN')
+@timed_query
+def get_all_rooms():
+    """Récupère toutes les salles, des plus grandes aux plus petites"""
+    conn = get_connection()
+    if not conn:
+        return query_failed([])
+
+    try:
+        cur = conn.cursor()
+        rooms = fetch_rooms(cur)
+        cur.close()
+        release_connection(conn)
+        return rooms
+
+    except Exception as e:
+        print(f"❌ Erreur récupération salles : {e}")
+        release_connection(conn)
+        return query_failed([])
+
+
+@cached_query('EXAMEN', 'MODULE', 'LIEU_EXAMEN', 'SURVEILLANCE', 'PROFESSEUR')
+@timed_query
+def get_exam_details_many(ids):
+    """Détails de plusieurs examens en un aller-retour : {id_exam: ExamDetails}"""
+    ids = sorted(set(ids))
+    if not ids:
+        return {}
+
+    conn = get_connection()
+    if not conn:
+        return query_failed({})
+
+    try:
+        cur = conn.cursor()
+        details = fetch_exam_details(cur, ids)
+        cur.close()
+        release_connection(conn)
+        return details
+
+    except Exception as e:
+        print(f"❌ Erreur récupération détails examens : {e}")
+        release_connection(conn)
+        return query_failed({})
+
+
+def get_exam_details(id_exam):
+    """Récupère les détails d'un examen (ExamDetails ou None)"""
+    return get_exam_details_many((id_exam,)).get(id_exam)
@@ -0,0 +1,230 @@
+# frontend/request_scope.py
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import wraps
+
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+DATASET_WORKERS = int(os.getenv('DATASET_WORKERS', 4))   # requêtes simultanées par page
+
+
+# ==========================================
+# PORTÉE D'UN RENDU (RERUN)
+# ==========================================
+# Pendant un rerun, les mêmes données sont souvent demandées plusieurs fois
+# (onglets rendus ensemble, aperçu puis génération...). La portée :
+# - mémorise les résultats des helpers de lecture jusqu'à la fin du rendu ;
+# - prête la connexion empruntée aux appels imbriqués du même thread, et la
+#   rend au pool dès que plus aucun helper ne l'utilise (pas de connexion
+#   immobilisée pendant les graphiques ou la résolution du planning).
+_current = ContextVar('request_scope', default=None)
+
+
+class _Connection:
+    """Connexion empruntée par une portée (séparée pour le finaliseur)"""
+
+    def __init__(self):
+        self.conn = None
+        self.release = None     # rend la connexion au pool
+        self.owner = None       # thread qui l'utilise
+        self.in_use = 0         # helpers en cours sur cette connexion
+        self.discard = False    # à détruire au lieu de la rendre au pool
+        self.lock = threading.Lock()
+
+    def close(self, discard=False):
+        with self.lock:
+            conn, release = self.conn, self.release
+            discard = discard or self.discard
+            self.conn, self.release, self.owner, self.in_use = None, None, None, 0
+            self.discard = False
+        if conn is not None:
+            release(conn, close=discard)
+
+
+class RequestScope:
+    def __init__(self):
+        self.memo = {}
+        self.hits = 0
+        self.connection = _Connection()
+        # Helper interrompu sans release_connection : la connexion est rendue
+        # quand la portée disparaît
+        self._finalizer = weakref.finalize(self, self.connection.close)
+
+    def close(self):
+        self._finalizer()
+
+
+def current_scope():
+    return _current.get()
+
+
+def open_request_scope():
+    """Début du rendu : nouvelle portée (la précédente du même thread est fermée)"""
+    close_request_scope()
+    scope = RequestScope()
+    _current.set(scope)
+    return scope
+
+
+def close_request_scope():
+    """Fin du rendu : résultats oubliés (connexion rendue si un helper ne l'a pas fait)"""
+    scope = _current.get()
+    if scope is not None:
+        scope.close()
+        _current.set(None)
+
+
+# ==========================================
+# CONNEXION PARTAGÉE (utilisée par db_utils)
+# ==========================================
+
+def acquire_scoped_connection(borrow, release):
+    """Connexion de la portée, sinon None (le pool prend le relais)
+
+    Le premier helper l'emprunte au pool, les appels imbriqués du même thread
+    la partagent ; un autre thread (load_in_parallel) a sa propre connexion.
+    borrow() emprunte une connexion au pool, release(conn, close) la rend.
+    """
+    scope = _current.get()
+    if scope is None:
+        return None
+
+    holder = scope.connection
+    thread = threading.get_ident()
+    with holder.lock:
+        if holder.in_use:
+            if holder.owner != thread or holder.conn.closed:
+                return None     # appel concurrent : connexion séparée
+            holder.in_use += 1
+            return holder.conn
+        holder.owner, holder.in_use = thread, 1
+
+    # Emprunt hors du verrou (peut attendre une place dans le pool)
+    conn = None
+    try:
+        conn = borrow()
+    finally:
+        with holder.lock:
+            if conn is None:
+                holder.owner, holder.in_use = None, 0
+            else:
+                holder.conn, holder.release = conn, release
+    return conn
+
+
+def release_scoped_connection(conn, close=False):
+    """Rend la connexion à la portée ; False si elle n'en vient pas
+
+    Le dernier utilisateur la rend au pool (qui annule la transaction en cours).
+    """
+    scope = _current.get()
+    if scope is None or scope.connection.conn is not conn:
+        return False
+
+    holder = scope.connection
+    with holder.lock:
+        holder.in_use -= 1
+        holder.discard = holder.discard or close
+        last = holder.in_use <= 0
+    if last:
+        holder.close()
+    return True
+
+
+# ==========================================
+# MÉMORISATION DES LECTURES
+# ==========================================
+MISSING = object()   # absent de la mémoire du rendu (None est une valeur valide)
+
+
+def memo_get(key):
+    scope = _current.get()
+    if scope is None:
+        return MISSING
+    value = scope.memo.get(key, MISSING)
+    if value is not MISSING:
+        scope.hits += 1
+        # Copie superficielle : ajouter une colonne ne modifie pas le résultat mémorisé
+        if isinstance(value, pd.DataFrame):
+            return value.copy(deep=False)
+    return value
+
+
+def memo_put(key, value):
+    scope = _current.get()
+    if scope is not None:
+        scope.memo[key] = value
+
+
+def request_memo(func):
+    """Mémorise un helper non mis en cache pour la durée du rendu"""
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = ('request_memo', name, args, tuple(sorted(kwargs.items())))
+        value = memo_get(key)
+        if value is not MISSING:
+            return value
+
+        value = func(*args, **kwargs)
+        if value is not None:
+            memo_put(key, value)
+        return value
+
+    return wrapper
+
+
+# ==========================================
+# CHARGEMENT PARALLÈLE DES DONNÉES D'UNE PAGE
+# ==========================================
+# Une page déclare d'abord ses jeux de données indépendants : ils sont lus
+# en même temps sur des connexions du pool, la page attend la plus lente
+# au lieu de la somme des allers-retours.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DATASET_WORKERS,
+                                           thread_name_prefix="page-datasets")
+        return _executor
+
+
+def _run_in_script_context(script_ctx, func, args):
+    # st.error & co. depuis le thread de travail s'affichent dans la page appelante
+    if script_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+    return func(*args)
+
+
+def load_in_parallel(**datasets):
+    """Charge les jeux de données d'une page en parallèle
+
+    datasets : nom -> helper ou (helper, *arguments). Renvoie {nom: résultat}.
+    Les threads partagent la portée du rendu : les résultats sont mémorisés
+    pour les appels suivants de la page.
+
+        data = load_in_parallel(modules=load_students_per_module,
+                                examens=load_exam_schedule)
+    """
+    calls = {name: spec if isinstance(spec, tuple) else (spec,)
+             for name, spec in datasets.items()}
+    if len(calls) < 2:
+        return {name: call[0](*call[1:]) for name, call in calls.items()}
+
+    script_ctx = get_script_run_ctx(suppress_warning=True)
+    executor = _get_executor()
+    futures = {
+        name: executor.submit(copy_context().run, _run_in_script_context,
+                              script_ctx, call[0], call[1:])
+        for name, call in calls.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
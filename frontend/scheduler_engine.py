@@ -2,7 +2,87 @@
 from ortools.sat.python import cp_model
 from datetime import datetime, timedelta
 import pandas as pd
-from db_utils import get_connection
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+from db_utils import get_connection, release_connection
+from instrumentation import timed_query
+from cache import cached_query, bump_tables, notify_tables, query_failed
+from migrations import guard_room_overlaps, room_conflicts
+from occupancy import OccupancyIndex
+from repository import fetch_modules, fetch_professors, fetch_rooms
+
+
+# ==========================================
+# CHARGEMENT DES DONNÉES DE PLANIFICATION
+# ==========================================
+@cached_query('MODULE', 'FORMATION', 'LIEU_EXAMEN', 'PROFESSEUR', 'ETUDIANT', 'EXAMEN')
+@timed_query
+def load_planning_snapshot(id_dept, niveaux):
+    """Lit toutes les données de planification d'un département en un seul instantané
+
+    Une seule connexion, une transaction REPEATABLE READ en lecture seule :
+    modules, salles, professeurs, formations et examens existants sont
+    cohérents entre eux. Modules, salles et professeurs sont les tuples nommés
+    de repository.py (mêmes types que l'interface). L'instantané est réutilisé tant que
+    les tables lues ne changent pas (aperçu puis génération).
+    """
+    conn = get_connection()
+    if not conn:
+        return query_failed(None)
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+
+        # Modules du département (avec au moins un inscrit)
+        modules = tuple(fetch_modules(
+            cur, "f.id_dept = %s AND f.niveau = ANY(%s) AND m.nb_inscrits > 0",
+            (id_dept, list(niveaux)), order_by="f.niveau, f.id_form, m.id_mod"
+        ))
+
+        # Toutes les salles
+        salles = tuple(fetch_rooms(cur))
+
+        # Profs du département
+        profs = tuple(fetch_professors(cur, "p.id_dept = %s", (id_dept,), order_by="p.id_prof"))
+
+        # Formations concernées (aperçu)
+        cur.execute("""
+        SELECT f.id_form, f.nom, f.niveau,
+               (SELECT COUNT(*) FROM ETUDIANT e WHERE e.id_form = f.id_form) AS nb_etudiants,
+               (SELECT COUNT(*) FROM MODULE m WHERE m.id_form = f.id_form) AS nb_modules
+        FROM FORMATION f
+        WHERE f.id_dept = %s AND f.niveau = ANY(%s)
+        ORDER BY f.niveau;
+        """, (id_dept, list(niveaux)))
+        formations = tuple(cur.fetchall())
+
+        # Examens déjà planifiés (créneaux à éviter)
+        cur.execute("""
+        SELECT date_exam, id_lieu, duree_min
+        FROM EXAMEN
+        ORDER BY date_exam;
+        """)
+        examens = tuple(cur.fetchall())
+
+        conn.rollback()
+        cur.close()
+        release_connection(conn)
+
+    except Exception as e:
+        print(f"❌ Erreur chargement données de planification : {e}")
+        if conn:
+            conn.rollback()
+            release_connection(conn)
+        return query_failed(None)
+
+    return {
+        'modules': modules,
+        'salles': salles,
+        'professeurs': profs,
+        'formations': formations,
+        'examens': examens
+    }
 
 
 class ExamScheduler:
@@ -12,58 +92,106 @@ class ExamScheduler:
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
 
-    def get_planning_data_by_dept(self, id_dept, niveaux):
-        """Récupère modules, salles et profs pour un département"""
-        conn = get_connection()
-        if not conn:
-            return None
+    def build_model(self, modules, salles, creneaux, occupation):
+        """Construit le modèle CP-SAT et renvoie les variables x[(m, c, s)]
 
-        cur = conn.cursor()
+        Les affectations impossibles (capacité insuffisante, salle déjà
+        occupée) ne reçoivent pas de variable : les contraintes utilisent
+        directement les primitives AddExactlyOne / AddAtMostOne et
+        l'utilisation des salles est exprimée par implications.
+        """
+        num_modules = len(modules)
+        num_creneaux = len(creneaux)
+        num_salles = len(salles)
 
-        # Modules du département
-        cur.execute("""
-        SELECT m.id_mod, m.nom, f.nom AS formation, f.id_form, f.niveau,
-               COUNT(DISTINCT i.id_etu) AS nb_inscrits
-        FROM MODULE m
-        JOIN FORMATION f ON m.id_form = f.id_form
-        LEFT JOIN INSCRIPTION i ON m.id_mod = i.id_mod
-        WHERE f.id_dept = %s AND f.niveau = ANY(%s)
-        GROUP BY m.id_mod, m.nom, f.nom, f.id_form, f.niveau
-        HAVING COUNT(DISTINCT i.id_etu) > 0
-        ORDER BY f.niveau, f.id_form, m.id_mod;
-        """, (id_dept, niveaux))
-        modules = cur.fetchall()
+        # ========================================
+        # C3bis: ⚠️ ÉVITER LES CRÉNEAUX DÉJÀ OCCUPÉS EN BASE
+        # ========================================
+        # (créneau, salle) chevauchant un examen existant
+        creneaux_occupes = {
+            (c, s)
+            for c in range(num_creneaux)
+            for s in range(num_salles)
+            if not occupation.is_free(salles[s].id_lieu, creneaux[c]['date'], creneaux[c]['duree'])
+        }
 
-        # Toutes les salles
-        cur.execute("""
-        SELECT id_lieu, nom, capacite, type_lieu
-        FROM LIEU_EXAMEN
-        ORDER BY capacite DESC;
-        """)
-        salles = cur.fetchall()
+        # ========================================
+        # NOUVELLE APPROCHE: 1 VARIABLE GLOBALE
+        # ========================================
 
-        # Profs du département
-        cur.execute("""
-        SELECT id_prof, nom, prenom, specialite
-        FROM PROFESSEUR
-        WHERE id_dept = %s
-        ORDER BY id_prof;
-        """, (id_dept,))
-        profs = cur.fetchall()
+        # Variable unique: module M planifié au créneau C dans la salle S
+        # 0 = non planifié, 1 = planifié
+        # C3 (capacité) et C3bis (créneaux occupés) : pas de variable du tout
+        x = {}
+        for m in range(num_modules):
+            nb_inscrits = modules[m].nb_inscrits
+            for s in range(num_salles):
+                if nb_inscrits > salles[s].capacite:
+                    continue
+                for c in range(num_creneaux):
+                    if (c, s) not in creneaux_occupes:
+                        x[(m, c, s)] = self.model.NewBoolVar(f'x_{m}_{c}_{s}')
 
-        cur.close()
-        conn.close()
+        print("🔒 CONTRAINTES ULTRA-STRICTES:\n")
+        print("   ✅ C3: Respect capacité salles")
+        if creneaux_occupes:
+            print(f"   ✅ C3bis: Éviter {len(creneaux_occupes)} créneaux déjà occupés")
 
-        return {
-            'modules': modules,
-            'salles': salles,
-            'professeurs': profs
-        }
+        par_module = [[] for _ in range(num_modules)]
+        par_creneau_salle = {}
+        par_salle = [[] for _ in range(num_salles)]
+        for (m, c, s), var in x.items():
+            par_module[m].append(var)
+            par_creneau_salle.setdefault((c, s), []).append(var)
+            par_salle[s].append(var)
+
+        # ========================================
+        # C1: Chaque module = EXACTEMENT 1 créneau + 1 salle
+        # ========================================
+        print("   ✅ C1: Chaque module assigné une seule fois")
+        for m in range(num_modules):
+            self.model.AddExactlyOne(par_module[m])
+
+        # ========================================
+        # C2: ⚠️ CRITIQUE - UNE SALLE = MAX 1 MODULE PAR CRÉNEAU
+        # ========================================
+        print("   ✅ C2: INTERDICTION ABSOLUE - 1 salle = 1 examen/créneau")
+        for variables in par_creneau_salle.values():
+            if len(variables) > 1:
+                self.model.AddAtMostOne(variables)
+
+        # ========================================
+        # C4: 1 examen/jour par formation
+        # ========================================
+        print("   ✅ C4: 1 examen/jour/formation")
+        par_formation_jour = {}
+        for (m, c, s), var in x.items():
+            key = (modules[m].id_form, creneaux[c]['jour'])
+            par_formation_jour.setdefault(key, []).append(var)
+
+        for variables in par_formation_jour.values():
+            if len(variables) > 1:
+                self.model.AddAtMostOne(variables)
+
+        # ========================================
+        # OBJECTIF: Minimiser le nombre de salles
+        # ========================================
+        salles_utilisees = []
+        for s in range(num_salles):
+            salle_used = self.model.NewBoolVar(f'used_s{s}')
+            # Un examen dans la salle implique que la salle est utilisée
+            for var in par_salle[s]:
+                self.model.AddImplication(var, salle_used)
+            salles_utilisees.append(salle_used)
+
+        self.model.Minimize(sum(salles_utilisees))
+
+        return x
 
     def generate_schedule_by_department(self, start_date, nb_jours, id_dept, niveaux):
         """Génère planning - APPROCHE SIMPLIFIÉE GARANTIE SANS CONFLIT"""
 
-        data = self.get_planning_data_by_dept(id_dept, niveaux)
+        data = load_planning_snapshot(id_dept, niveaux)
         if not data:
             return None
 
@@ -72,31 +200,14 @@ class ExamScheduler:
         profs = data['professeurs']
 
         # ========================================
-        # RÉCUPÉRER LES EXAMENS DÉJÀ PLANIFIÉS
+        # EXAMENS DÉJÀ PLANIFIÉS (lus dans le même instantané)
         # ========================================
-        examens_existants = []
-        conn = get_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("""
-            SELECT e.date_exam, e.id_lieu, e.duree_min, l.nom, m.nom, f.nom
-            FROM EXAMEN e
-            JOIN LIEU_EXAMEN l ON e.id_lieu = l.id_lieu
-            JOIN MODULE m ON e.id_mod = m.id_mod
-            JOIN FORMATION f ON m.id_form = f.id_form
-            ORDER BY e.date_exam;
-            """)
-            examens_existants = cur.fetchall()
-            cur.close()
-            conn.close()
-
-            if examens_existants:
-                print(f"\n⚠️  {len(examens_existants)} examens DÉJÀ en base - ils seront évités\n")
+        examens_existants = data['examens']
+        if examens_existants:
+            print(f"\n⚠️  {len(examens_existants)} examens DÉJÀ en base - ils seront évités\n")
 
-        # Créer un set des créneaux occupés: (date, id_lieu)
-        creneaux_occupes = set()
-        for exam in examens_existants:
-            creneaux_occupes.add((exam[0], exam[1]))
+        # Index des salles occupées (chevauchement d'intervalles, pas seulement même heure)
+        occupation = OccupancyIndex(examens_existants)
 
         if not modules:
             print(f"❌ Aucun module trouvé")
@@ -136,105 +247,7 @@ class ExamScheduler:
 
         print(f"📊 {num_modules} modules, {num_creneaux} créneaux, {num_salles} salles\n")
 
-        # ========================================
-        # NOUVELLE APPROCHE: 1 VARIABLE GLOBALE
-        # ========================================
-
-        # Variable unique: module M planifié au créneau C dans la salle S
-        # 0 = non planifié, 1 = planifié
-        x = {}
-        for m in range(num_modules):
-            for c in range(num_creneaux):
-                for s in range(num_salles):
-                    x[(m, c, s)] = self.model.NewBoolVar(f'x_{m}_{c}_{s}')
-
-        print("🔒 CONTRAINTES ULTRA-STRICTES:\n")
-
-        # ========================================
-        # C1: Chaque module = EXACTEMENT 1 créneau + 1 salle
-        # ========================================
-        print("   ✅ C1: Chaque module assigné une seule fois")
-        for m in range(num_modules):
-            self.model.Add(
-                sum(x[(m, c, s)]
-                    for c in range(num_creneaux)
-                    for s in range(num_salles)) == 1
-            )
-
-        # ========================================
-        # C2: ⚠️ CRITIQUE - UNE SALLE = MAX 1 MODULE PAR CRÉNEAU
-        # ========================================
-        print("   ✅ C2: INTERDICTION ABSOLUE - 1 salle = 1 examen/créneau")
-        for c in range(num_creneaux):
-            for s in range(num_salles):
-                # SOMME <= 1 signifie: AU MAXIMUM 1 module peut être dans cette salle à ce créneau
-                self.model.Add(
-                    sum(x[(m, c, s)] for m in range(num_modules)) <= 1
-                )
-
-        # ========================================
-        # C3: Capacité des salles
-        # ========================================
-        print("   ✅ C3: Respect capacité salles")
-        for m in range(num_modules):
-            nb_inscrits = modules[m][5]
-            for c in range(num_creneaux):
-                for s in range(num_salles):
-                    capacite_salle = salles[s][2]
-                    if nb_inscrits > capacite_salle:
-                        # Forcer x[(m,c,s)] = 0
-                        self.model.Add(x[(m, c, s)] == 0)
-
-        # ========================================
-        # C3bis: ⚠️ ÉVITER LES CRÉNEAUX DÉJÀ OCCUPÉS EN BASE
-        # ========================================
-        if creneaux_occupes:
-            print(f"   ✅ C3bis: Éviter {len(creneaux_occupes)} créneaux déjà occupés")
-            for m in range(num_modules):
-                for c in range(num_creneaux):
-                    for s in range(num_salles):
-                        date_creneau = creneaux[c]['date']
-                        id_salle = salles[s][0]
-
-                        # Si ce créneau est déjà occupé, interdire cette affectation
-                        if (date_creneau, id_salle) in creneaux_occupes:
-                            self.model.Add(x[(m, c, s)] == 0)
-
-        # ========================================
-        # C4: 1 examen/jour par formation
-        # ========================================
-        print("   ✅ C4: 1 examen/jour/formation")
-        formations = {}
-        for idx, module in enumerate(modules):
-            form_id = module[3]
-            if form_id not in formations:
-                formations[form_id] = []
-            formations[form_id].append(idx)
-
-        for form_id, module_indices in formations.items():
-            for jour in range(nb_jours):
-                creneaux_jour = [c for c in range(num_creneaux) if creneaux[c]['jour'] == jour]
-                self.model.Add(
-                    sum(x[(m, c, s)]
-                        for m in module_indices
-                        for c in creneaux_jour
-                        for s in range(num_salles)) <= 1
-                )
-
-        # ========================================
-        # OBJECTIF: Minimiser le nombre de salles
-        # ========================================
-        salles_utilisees = []
-        for s in range(num_salles):
-            salle_used = self.model.NewBoolVar(f'used_s{s}')
-            # Une salle est utilisée si au moins 1 examen y a lieu
-            self.model.AddMaxEquality(
-                salle_used,
-                [x[(m, c, s)] for m in range(num_modules) for c in range(num_creneaux)]
-            )
-            salles_utilisees.append(salle_used)
-
-        self.model.Minimize(sum(salles_utilisees))
+        x = self.build_model(modules, salles, creneaux, occupation)
 
         # ========================================
         # RÉSOLUTION
@@ -259,28 +272,26 @@ class ExamScheduler:
             planning = []
 
             # Extraire les affectations
-            for m in range(num_modules):
-                for c in range(num_creneaux):
-                    for s in range(num_salles):
-                        if self.solver.Value(x[(m, c, s)]) == 1:
-                            # Assigner des surveillants aléatoires (simple)
-                            surveillants = [profs[m % num_profs]]
-                            if num_profs > 1:
-                                surveillants.append(profs[(m + 1) % num_profs])
-
-                            planning.append({
-                                'module_id': modules[m][0],
-                                'module_nom': modules[m][1],
-                                'formation': modules[m][2],
-                                'niveau': modules[m][4],
-                                'nb_inscrits': modules[m][5],
-                                'date_exam': creneaux[c]['date'],
-                                'duree_min': creneaux[c]['duree'],
-                                'salle_id': salles[s][0],
-                                'salle_nom': salles[s][1],
-                                'capacite': salles[s][2],
-                                'surveillants': surveillants
-                            })
+            for (m, c, s), var in x.items():
+                if self.solver.Value(var) == 1:
+                    # Assigner des surveillants aléatoires (simple)
+                    surveillants = [profs[m % num_profs]]
+                    if num_profs > 1:
+                        surveillants.append(profs[(m + 1) % num_profs])
+
+                    planning.append({
+                        'module_id': modules[m].id_mod,
+                        'module_nom': modules[m].nom,
+                        'formation': modules[m].formation,
+                        'niveau': modules[m].niveau,
+                        'nb_inscrits': modules[m].nb_inscrits,
+                        'date_exam': creneaux[c]['date'],
+                        'duree_min': creneaux[c]['duree'],
+                        'salle_id': salles[s].id_lieu,
+                        'salle_nom': salles[s].nom,
+                        'capacite': salles[s].capacite,
+                        'surveillants': surveillants
+                    })
 
             planning.sort(key=lambda x: x['date_exam'])
 
@@ -332,79 +343,88 @@ class ExamScheduler:
             print(f"\n⚠️ Statut: {self.solver.StatusName(status)}\n")
             return None
 
+    @timed_query
     def save_planning_to_db(self, planning):
-        """Sauvegarde en base avec vérification finale anti-doublon"""
+        """Sauvegarde en base avec vérification finale anti-doublon
+
+        Tout se fait dans une seule transaction avec des insertions groupées.
+        Les chevauchements de salles sont refusés par la contrainte
+        d'exclusion examen_salle_sans_chevauchement (voir migrations.py) :
+        deux sauvegardes concurrentes ne peuvent donc pas se marcher dessus.
+        Tant que la contrainte manque, le planning est vérifié après
+        insertion, EXAMEN verrouillée (guard_room_overlaps).
+        """
         conn = get_connection()
         if not conn:
             return False
 
         try:
             cur = conn.cursor()
+            check_rooms = guard_room_overlaps(cur)
+
+            print("\n💾 Insertion en BD (contrôle des chevauchements par PostgreSQL)...\n")
+
+            # Insérer tous les examens en une seule requête
+            rows = execute_values(cur, """
+            INSERT INTO EXAMEN (date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu)
+            VALUES %s
+            RETURNING id_exam, id_mod, id_lieu, date_exam;
+            """, [
+                (exam['date_exam'], exam['duree_min'], 'partiel', 'S1',
+                 exam['module_id'], exam['salle_id'])
+                for exam in planning
+            ], page_size=1000, fetch=True)
+
+            # (module, salle, date) identifie un examen du planning de façon unique
+            ids_exam = {(r[1], r[2], r[3]): r[0] for r in rows}
+
+            conflicts = room_conflicts(cur, ids_exam.values()) if check_rooms else []
+            if conflicts:
+                print(f"❌ CONFLIT DÉTECTÉ EN BD:")
+                for id_lieu, id_exam, date_exam, other, other_date in conflicts[:10]:
+                    print(f"   Salle {id_lieu} : examen {id_exam} ({date_exam}) / examen {other} ({other_date})")
+                print("   Une salle est déjà occupée sur un créneau qui chevauche le planning")
+                conn.rollback()
+                release_connection(conn)
+                return False
 
-            print("\n🔍 Vérification finale avant insertion en BD...\n")
-
-            # Vérifier les doublons AVANT insertion
-            for exam in planning:
-                cur.execute("""
-                SELECT e.id_exam, m.nom, f.nom
-                FROM EXAMEN e
-                JOIN MODULE m ON e.id_mod = m.id_mod
-                JOIN FORMATION f ON m.id_form = f.id_form
-                WHERE e.id_lieu = %s 
-                AND e.date_exam = %s;
-                """, (exam['salle_id'], exam['date_exam']))
-
-                existing = cur.fetchall()
-
-                if existing:
-                    print(f"❌ CONFLIT DÉTECTÉ EN BD:")
-                    print(f"   Salle: {exam['salle_nom']}")
-                    print(f"   Date: {exam['date_exam']}")
-                    print(f"   Examen existant: {existing[0][1]} ({existing[0][2]})")
-                    print(f"   Nouveau: {exam['module_nom']} ({exam['formation']})")
-
-                    conn.rollback()
-                    cur.close()
-                    conn.close()
-                    return False
-
-            # Si OK, insérer
-            print("✅ Aucun conflit - Insertion en cours...\n")
-
+            # Insérer surveillants
+            surveillances = []
             for exam in planning:
-                cur.execute("""
-                INSERT INTO EXAMEN (date_exam, duree_min, type_examen, session_examen, id_mod, id_lieu)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id_exam;
-                """, (
-                    exam['date_exam'],
-                    exam['duree_min'],
-                    'partiel',
-                    'S1',
-                    exam['module_id'],
-                    exam['salle_id']
-                ))
-
-                id_exam = cur.fetchone()[0]
-
-                # Insérer surveillants
+                id_exam = ids_exam[(exam['module_id'], exam['salle_id'], exam['date_exam'])]
                 for idx, prof in enumerate(exam['surveillants']):
                     role = 'principal' if idx == 0 else 'assistant'
-                    cur.execute("""
-                    INSERT INTO SURVEILLANCE (id_exam, id_prof, role)
-                    VALUES (%s, %s, %s);
-                    """, (id_exam, prof[0], role))
+                    surveillances.append((id_exam, prof.id_prof, role))
+
+            if surveillances:
+                execute_values(cur, """
+                INSERT INTO SURVEILLANCE (id_exam, id_prof, role)
+                VALUES %s;
+                """, surveillances, page_size=1000)
 
+            # Planning précalculé des étudiants concernés, publié avec les examens
+            cur.execute("SELECT rafraichir_planning_etudiants(%s);", (list(ids_exam.values()),))
+
+            notify_tables(cur, 'EXAMEN', 'SURVEILLANCE')
             conn.commit()
             cur.close()
-            conn.close()
+            release_connection(conn)
+            bump_tables('EXAMEN', 'SURVEILLANCE')
 
             print(f"✅ {len(planning)} examens sauvegardés SANS CONFLIT\n")
             return True
 
+        except errors.ExclusionViolation as e:
+            print(f"❌ CONFLIT DÉTECTÉ EN BD:")
+            print(f"   {e.diag.message_detail}")
+            print("   Une salle est déjà occupée sur un créneau qui chevauche le planning")
+            conn.rollback()
+            release_connection(conn)
+            return False
+
         except Exception as e:
             print(f"\n❌ Erreur lors de la sauvegarde: {e}\n")
             if conn:
                 conn.rollback()
-                conn.close()
-            return False
\ No newline at end of file
+                release_connection(conn)
+            return False
@@ -1,7 +1,9 @@
 # frontend/users_db.py
 import psycopg2
 import hashlib
-from db_utils import get_connection  # ← CORRECTION : db au lieu de db_utils
+from db_utils import get_connection, release_connection  # ← CORRECTION : db au lieu de db_utils
+from instrumentation import timed_query
+from cache import bump_tables, notify_tables
 
 
 def hash_password(password):
@@ -9,6 +11,7 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+@timed_query
 def init_users_table():
     """Crée la table des utilisateurs si elle n'existe pas"""
     conn = get_connection()
@@ -87,23 +90,28 @@ def init_users_table():
 
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
         return True
 
     except Exception as e:
         print(f"❌ Erreur : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
-def verify_user(username, password):
-    """Vérifie les identifiants utilisateur"""
+@timed_query
+def verify_user(username, password, on_error=None):
+    """Vérifie les identifiants utilisateur
+
+    Renvoie le compte, None si les identifiants sont faux, ou on_error si la
+    base n'a pas pu répondre (par défaut None aussi ; l'API le distingue).
+    """
     conn = get_connection()
     if not conn:
         print("❌ Pas de connexion")
-        return None
+        return on_error
 
     try:
         cur = conn.cursor()
@@ -112,27 +120,52 @@ def verify_user(username, password):
         print(f"🔍 Tentative connexion: {username}")
         print(f"🔐 Hash généré: {password_hash}")
 
+        # Compte + dossier étudiant / professeur lié (lien résolu par email
+        # s'il n'est pas encore enregistré, par exemple compte créé avant le dossier)
         cur.execute("""
-        SELECT id_user, username, role, nom, prenom, email
-        FROM UTILISATEURS
-        WHERE username = %s AND password_hash = %s;
+        SELECT u.id_user, u.username, u.role, u.nom, u.prenom, u.email,
+               COALESCE(u.id_etu, le.id_etu) AS id_etu,
+               COALESCE(u.id_prof, lp.id_prof) AS id_prof,
+               f.nom AS formation,
+               (u.id_etu IS NULL AND le.id_etu IS NOT NULL)
+                   OR (u.id_prof IS NULL AND lp.id_prof IS NOT NULL) AS nouveau_lien
+        FROM UTILISATEURS u
+        LEFT JOIN LATERAL (
+            SELECT e.id_etu FROM ETUDIANT e
+            WHERE u.role = 'etudiant' AND u.id_etu IS NULL AND LOWER(e.email) = LOWER(u.email)
+            ORDER BY e.id_etu LIMIT 1
+        ) le ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT p.id_prof FROM PROFESSEUR p
+            WHERE u.role = 'professeur' AND u.id_prof IS NULL AND LOWER(p.email) = LOWER(u.email)
+            ORDER BY p.id_prof LIMIT 1
+        ) lp ON TRUE
+        LEFT JOIN ETUDIANT e ON e.id_etu = COALESCE(u.id_etu, le.id_etu)
+        LEFT JOIN FORMATION f ON f.id_form = e.id_form
+        WHERE u.username = %s AND u.password_hash = %s;
         """, (username, password_hash))
 
         user = cur.fetchone()
 
         if user:
-            # Mettre à jour le dernier login
+            # Mettre à jour le dernier login (et enregistrer le lien trouvé)
             cur.execute("""
             UPDATE UTILISATEURS 
-            SET dernier_login = CURRENT_TIMESTAMP 
+            SET dernier_login = CURRENT_TIMESTAMP,
+                id_etu = %s,
+                id_prof = %s
             WHERE id_user = %s;
-            """, (user[0],))
+            """, (user[6], user[7], user[0]))
+            if user[9]:
+                notify_tables(cur, 'UTILISATEURS', key=user[1])
             conn.commit()
+            if user[9]:
+                bump_tables('UTILISATEURS')
 
             print(f"✅ Connexion réussie : {user[1]} ({user[2]})")
 
             cur.close()
-            conn.close()
+            release_connection(conn)
 
             return {
                 'id': user[0],
@@ -140,22 +173,26 @@ def verify_user(username, password):
                 'role': user[2],
                 'nom': user[3],
                 'prenom': user[4],
-                'email': user[5]
+                'email': user[5],
+                'id_etu': user[6],
+                'id_prof': user[7],
+                'formation': user[8]
             }
         else:
             print(f"❌ Aucun utilisateur trouvé pour {username}")
 
         cur.close()
-        conn.close()
+        release_connection(conn)
         return None
 
     except Exception as e:
         print(f"❌ Erreur vérification : {e}")
         if conn:
-            conn.close()
-        return None
+            release_connection(conn)
+        return on_error
 
 
+@timed_query
 def create_user(username, password, role, nom, prenom, email):
     """Crée un nouvel utilisateur"""
     conn = get_connection()
@@ -171,27 +208,30 @@ def create_user(username, password, role, nom, prenom, email):
         VALUES (%s, %s, %s, %s, %s, %s);
         """, (username, password_hash, role, nom, prenom, email))
 
+        notify_tables(cur, 'UTILISATEURS', key=username)
         conn.commit()
         print(f"✅ Utilisateur créé : {username} ({role})")
 
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('UTILISATEURS')
         return True
 
     except psycopg2.IntegrityError:
         print(f"❌ Utilisateur {username} existe déjà")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
     except Exception as e:
         print(f"❌ Erreur création : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 
+@timed_query
 def get_all_users():
     """Récupère tous les utilisateurs (pour l'admin)"""
     conn = get_connection()
@@ -209,7 +249,7 @@ def get_all_users():
 
         users = cur.fetchall()
         cur.close()
-        conn.close()
+        release_connection(conn)
 
         return [{
             'id': u[0],
@@ -225,10 +265,11 @@ def get_all_users():
     except Exception as e:
         print(f"❌ Erreur récupération utilisateurs : {e}")
         if conn:
-            conn.close()
+            release_connection(conn)
         return []
 
 
+@timed_query
 def delete_user(user_id):
     """Supprime un utilisateur"""
     conn = get_connection()
@@ -238,16 +279,18 @@ def delete_user(user_id):
     try:
         cur = conn.cursor()
         cur.execute("DELETE FROM UTILISATEURS WHERE id_user = %s;", (user_id,))
+        notify_tables(cur, 'UTILISATEURS', key=user_id)
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
+        bump_tables('UTILISATEURS')
         return True
 
     except Exception as e:
         print(f"❌ Erreur suppression : {e}")
         if conn:
             conn.rollback()
-            conn.close()
+            release_connection(conn)
         return False
 
 